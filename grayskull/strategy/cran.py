@@ -1,28 +1,78 @@
 from __future__ import annotations
 
+import hashlib
+import html
+import json
 import logging
 import os
 import re
 import sys
 import tarfile
-import zipfile
+import time
+from contextlib import ExitStack
 from copy import deepcopy
-from os.path import basename
-from tempfile import mkdtemp
-from urllib.request import Request, urlopen
+from email.utils import formatdate
+from functools import lru_cache
+from pathlib import Path
+from tempfile import NamedTemporaryFile
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from souschef.jinja_expression import set_global_jinja_var
+from urllib3.util import Retry
 
 from grayskull.cli.stdout import print_msg
 from grayskull.config import Configuration
 from grayskull.license.discovery import match_license
 from grayskull.strategy.abstract_strategy import AbstractStrategy
-from grayskull.utils import sha256_checksum
+from grayskull.utils import HashingReader, get_cache_dir, sha256_checksum
+
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
+
+try:
+    import libarchive
+except ImportError:
+    libarchive = None
+else:
+    # python-libarchive installs a module with the same name but another API
+    if not hasattr(libarchive, "stream_reader"):
+        libarchive = None
 
 log = logging.getLogger(__name__)
 
+# Seconds during which the cached CRAN index is used without asking the server
+CRAN_INDEX_TTL = 6 * 60 * 60
+# Maximum size in bytes of the downloaded tarballs kept in the cache, the least
+# recently used ones are removed once it is exceeded
+CRAN_CACHE_MAX_SIZE = 512 * 1024 * 1024
+# Format of the cached DESCRIPTION metadata, bump it when that format changes
+CRAN_METADATA_CACHE_VERSION = 2
+# "Key: value" field of a DESCRIPTION file, including its continuation lines
+RE_DESCRIPTION_FIELD = re.compile(rb"^([^\s:][^:\n]*):(.*(?:\n[ \t].*)*)", re.MULTILINE)
+RE_CONTINUATION = re.compile(rb"\n[ \t]+")
+# Whitespace at the end of a line
+RE_TRAILING_WHITESPACE = re.compile(rb"[ \t\r\f\v]+$", re.MULTILINE)
+# Link of a directory listing page, capturing its href and text
+RE_ANCHOR = re.compile(r'<a\s[^>]*?href="([^"]*)"[^>]*>([^<]*)</a>', re.IGNORECASE)
+# Separator of the components of an R package version, like 1.2-3
+RE_R_VERSION_SEP = re.compile(r"[.-]")
+# Package name and optional version constraint of an "Imports" entry
+RE_IMPORT = re.compile(r"([\w.]+)\s*(?:\(\s*([^)]*?)\s*\))?")
+
+# Shared session, every request goes to the same CRAN host so keep-alive
+# connections avoid a new TCP/TLS handshake per request.
+CRAN_SESSION = requests.Session()
+_cran_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=3, backoff_factor=0.3),
+)
+CRAN_SESSION.mount("https://", _cran_adapter)
+CRAN_SESSION.mount("http://", _cran_adapter)
+
 ALL_SECTIONS = (
     "package",
     "source",
@@ -59,125 +109,183 @@ class CranStrategy(AbstractStrategy):
         return recipe
 
 
-def dict_from_cran_lines(lines):
-    """Convert the data extracted from the description file into a dictionary"""
+def decode_description(content: bytes) -> str:
+    """Decode a piece of a DESCRIPTION file. Those files are almost always pure
+    ASCII, for which latin-1 is an identical and cheaper decode than utf-8 (no
+    multi-byte validation).
+    """
+    if content.isascii():
+        return content.decode("latin-1")
+    return content.decode("utf-8", errors="replace")
+
+
+def parse_description(content: bytes) -> dict:
+    """Convert the content of a DESCRIPTION file into a dictionary, joining
+    the continuation lines of each field in a single regex pass. Only the
+    keys and values are decoded, the splitting is done over the raw bytes.
+
+    >>> metadata = parse_description(
+    ...     b"Package: A3\\n"
+    ...     b"Version: 0.9.2\\n"
+    ...     b"Depends: R (>= 2.15.0), xtable, pbapply\\n"
+    ...     b"Suggests: randomForest, e1071\\n"
+    ...     b"Imports: MASS, R.methodsS3 (>= 1.5.2), R.oo (>= 1.15.8), R.utils (>=\\n"
+    ...     b"        1.27.1), matrixStats (>= 0.8.12), R.filesets (>= 2.3.0),\\n"
+    ...     b"        sampleSelection, scatterplot3d, strucchange, systemfit\\n"
+    ...     b"License: GPL (>= 2)\\n"
+    ...     b"NeedsCompilation: no"
+    ... )
+    >>> metadata["Imports"]  # doctest: +NORMALIZE_WHITESPACE
+    'MASS, R.methodsS3 (>= 1.5.2), R.oo (>= 1.15.8), R.utils (>= 1.27.1),
+     matrixStats (>= 0.8.12), R.filesets (>= 2.3.0), sampleSelection,
+     scatterplot3d, strucchange, systemfit'
+    >>> metadata["orig_lines"][-1]
+    'NeedsCompilation: no'
+    """  # NOQA
+    # Due to how the metadata is rendered there can be trailing spaces, blank
+    # lines need no special care as the gaps between fields are skipped
+    content = RE_TRAILING_WHITESPACE.sub(b"", content)
     d = {}
-    for line in lines:
-        if not line:
-            continue
-        try:
-            (k, v) = line.split(": ", 1) if ": " in line else line.split(":", 1)
-        except ValueError:
-            sys.exit(f"Error: Could not parse metadata ({line})")
-        d[k] = v
-    d["orig_lines"] = lines
+    orig_lines = []
+    end = 0
+    for match in RE_DESCRIPTION_FIELD.finditer(content):
+        if unparsed := content[end : match.start()].strip():
+            sys.exit(
+                f"Error: Could not parse metadata ({decode_description(unparsed)})"
+            )
+        end = match.end()
+        key = match.group(1)
+        line = RE_CONTINUATION.sub(b" ", match.group(0))
+        orig_lines.append(decode_description(line))
+        value = line[len(key) + 1 :]
+        if value.startswith(b" "):
+            value = value[1:]
+        d[decode_description(key)] = decode_description(value)
+    if unparsed := content[end:].strip():
+        sys.exit(f"Error: Could not parse metadata ({decode_description(unparsed)})")
+    d["orig_lines"] = orig_lines
     return d
 
 
-def remove_package_line_continuations(chunk):
+def read_description_contents(fp):
+    """Reads the description file contents and formats them by
+    running other functions on the content and returns the dictionary.
     """
-    >>> chunk = [
-    ...     'Package: A3',
-    ...     'Version: 0.9.2',
-    ...     'Depends: R (>= 2.15.0), xtable, pbapply',
-    ...     'Suggests: randomForest, e1071',
-    ...     'Imports: MASS, R.methodsS3 (>= 1.5.2), R.oo (>= 1.15.8), R.utils (>=',
-    ...     '        1.27.1), matrixStats (>= 0.8.12), R.filesets (>= 2.3.0), ',
-    ...     '        sampleSelection, scatterplot3d, strucchange, systemfit',
-    ...     'License: GPL (>= 2)',
-    ...     'NeedsCompilation: no']
-    >>> remove_package_line_continuations(chunk)  # doctest: +NORMALIZE_WHITESPACE
-    ['Package: A3',
-     'Version: 0.9.2',
-     'Depends: R (>= 2.15.0), xtable, pbapply',
-     'Suggests: randomForest, e1071',
-     'Imports: MASS, R.methodsS3 (>= 1.5.2), R.oo (>= 1.15.8), R.utils (>= 1.27.1), matrixStats (>= 0.8.12), R.filesets (>= 2.3.0),  sampleSelection, scatterplot3d, strucchange, systemfit',
-     'License: GPL (>= 2)',
-     'NeedsCompilation: no',
-     '']
-    """  # NOQA
-    continuation = (" ", "\t")
-    continued_ix = None
-    continued_line = None
-    had_continuation = False
-    accumulating_continuations = False
-
-    chunk.append("")
-
-    for i, line in enumerate(chunk):
-        if line.startswith(continuation):
-            line = f" {line.lstrip()}"
-            if accumulating_continuations:
-                assert had_continuation
-                continued_line += line
-            else:
-                accumulating_continuations = True
-                continued_ix = i - 1
-                continued_line = chunk[continued_ix] + line
-                had_continuation = True
-            chunk[i] = None
-        elif accumulating_continuations:
-            assert had_continuation
-            chunk[continued_ix] = continued_line
-            accumulating_continuations = False
-            continued_line = None
-            continued_ix = None
-
-    if had_continuation:
-        # Remove the None(s).
-        chunk = [c for c in chunk if c]
-
-    chunk.append("")
-    return chunk
-
-
-def clear_whitespace(string):
-    """Due to how the metadata is rendered there can be
-    significant areas of repeated newlines.
-    This collapses them and also strips any trailing spaces.
+    return parse_description(fp.read())
+
+
+def is_description_member(name: str) -> bool:
+    """Check if the archive member is the DESCRIPTION file of the package.
+
+    >>> is_description_member("A3/DESCRIPTION")
+    True
+    >>> is_description_member("A3/inst/DESCRIPTION")
+    False
+    >>> is_description_member("/DESCRIPTION")
+    False
     """
-    lines = []
-    last_line = ""
-    for line in string.splitlines():
-        line = line.rstrip()
-        if line or last_line:
-            lines.append(line)
-        last_line = line
-    return "\n".join(lines)
+    # DESCRIPTION placed in the top-level folder of the archive
+    return (
+        name.endswith("/DESCRIPTION")
+        and name.count("/") == 1
+        and len(name) > len("/DESCRIPTION")
+    )
 
 
-def read_description_contents(fp):
-    """Reads the description file contents and formats them by
-    running other functions on the content and returns the dictionary.
+@lru_cache(maxsize=8)
+def get_cran_contrib_index(cran_url: str) -> dict[str, tuple[str, str, str]]:
+    """Index the tarballs listed in ``{cran_url}/src/contrib/``.
+
+    The index is kept on disk for ``CRAN_INDEX_TTL`` seconds. After that the
+    page is only downloaded and parsed again if it was modified on the server.
+
+    :return: dictionary mapping the lower-cased package name to a tuple with
+        the package name, its version and the href of the tarball.
     """
-    bytes_ = fp.read()
-    text = bytes_.decode("utf-8", errors="replace")
-    text = clear_whitespace(text)
-    lines = remove_package_line_continuations(text.splitlines())
-    return dict_from_cran_lines(lines)
-
-
-def get_archive_metadata(path):
-    """Extracting the DESCRIPTION file from the downloaded package."""
-    print_msg(f"Reading package metadata from {path}")
-    if basename(path) == "DESCRIPTION":
-        with open(path, "rb") as fp:
-            return read_description_contents(fp)
-    elif tarfile.is_tarfile(path):
-        with tarfile.open(path, "r") as tf:
-            for member in tf:
-                if re.match(r"^[^/]+/DESCRIPTION$", member.name):
-                    fp = tf.extractfile(member)
-                    return read_description_contents(fp)
-    elif path.endswith(".zip"):
-        with zipfile.ZipFile(path, "r") as zf:
-            for member in zf.infolist():
-                if re.match(r"^[^/]+/DESCRIPTION$", member.filename):
-                    fp = zf.open(member, "r")
-                    return read_description_contents(fp)
-    else:
-        sys.exit(f"Cannot extract a DESCRIPTION from file {path}")
-    sys.exit(f"{path} does not seem to be a CRAN package (no DESCRIPTION) file")
+    url_hash = hashlib.sha256(cran_url.encode()).hexdigest()[:16]
+    cache_file = get_cache_dir("cran") / f"index-{url_hash}.json"
+    cache_mtime = cache_file.stat().st_mtime if cache_file.is_file() else None
+    if cache_mtime is not None and time.time() - cache_mtime < CRAN_INDEX_TTL:
+        if (index := _read_cran_index_cache(cache_file)) is not None:
+            return index
+        cache_mtime = None
+
+    webpage = get_webpage(f"{cran_url}/src/contrib/", modified_since=cache_mtime)
+    if webpage is None:
+        if (index := _read_cran_index_cache(cache_file)) is not None:
+            cache_file.touch()
+            return index
+        webpage = get_webpage(f"{cran_url}/src/contrib/")
+
+    index = {}
+    add_record = index.setdefault
+    for href, url_text in webpage:
+        if not url_text.endswith(".tar.gz"):
+            continue
+        name, sep, version = url_text[: -len(".tar.gz")].rpartition("_")
+        if sep:
+            name = name.strip()
+            add_record(name.lower(), (name, version.strip().lower(), href))
+    _write_json_cache(cache_file, index)
+    return index
+
+
+def invalidate_cran_contrib_index(cran_url: str):
+    """Drop the cached CRAN index, the next lookup fetches it from the server.
+
+    Used when the cached index went stale, CRAN moves the previous tarball of
+    a package to the Archive as soon as a new release is published.
+    """
+    url_hash = hashlib.sha256(cran_url.encode()).hexdigest()[:16]
+    (get_cache_dir("cran") / f"index-{url_hash}.json").unlink(missing_ok=True)
+    get_cran_contrib_index.cache_clear()
+
+
+def _partial_cache_file(cache_file, mode: str):
+    """Open a uniquely named file next to ``cache_file`` to be renamed over it
+    once complete, so concurrent writers never share a partial file."""
+    return NamedTemporaryFile(
+        mode,
+        dir=cache_file.parent,
+        prefix=f"{cache_file.name}.",
+        suffix=".part",
+        delete=False,
+    )
+
+
+def _write_json_cache(cache_file, content):
+    with _partial_cache_file(cache_file, "w") as f:
+        json.dump(content, f)
+    os.replace(f.name, cache_file)
+
+
+def _read_cran_index_cache(cache_file) -> dict[str, tuple[str, str, str]] | None:
+    """Read the cached CRAN index.
+
+    :return: None if the cache file is missing or corrupted
+    """
+    try:
+        with open(cache_file) as f:
+            return {name: tuple(record) for name, record in json.load(f).items()}
+    except (OSError, ValueError, AttributeError, TypeError):
+        return None
+
+
+def is_newer_r_version(version: str, other: str) -> bool:
+    """Check if the R package ``version`` is newer than ``other``.
+
+    >>> is_newer_r_version("1.10-1", "1.9.3")
+    True
+    >>> is_newer_r_version("0.1.0", "1.0.0")
+    False
+    """
+    try:
+        return tuple(map(int, RE_R_VERSION_SEP.split(version))) > tuple(
+            map(int, RE_R_VERSION_SEP.split(other))
+        )
+    except ValueError:
+        # Not a valid R version, just check whether they differ
+        return version != other
 
 
 def scrap_main_page_cran_find_latest_package(
@@ -185,27 +293,42 @@ def scrap_main_page_cran_find_latest_package(
 ):
     pkg_name = pkg_name.strip().lower()
     pkg_version = pkg_version.strip().lower() if pkg_version else None
-    for url_a in get_webpage(f"{cran_url}/src/contrib/").findAll("a"):
-        url_text = url_a.get_text()
-        if url_text.endswith(".tar.gz") and "_" in url_text:
-            name, version = url_text.rsplit(".", 2)[0].rsplit("_", 1)
-            version = version.strip().lower()
-            name = name.strip().lower()
-            if name == pkg_name:
-                pkg_url = f"{cran_url}/src/contrib/Archive"
-                if pkg_version is None or pkg_version == version:
-                    pkg_version = version
-                    pkg_url = f"{cran_url}/src/contrib/{url_a.get('href')}"
-                return pkg_name, pkg_version, pkg_url
+    record = get_cran_contrib_index(cran_url).get(pkg_name)
+    if record is None or (pkg_version and is_newer_r_version(pkg_version, record[1])):
+        # The package or version may have been released after the index was
+        # cached, look it up again in a fresh index
+        invalidate_cran_contrib_index(cran_url)
+        record = get_cran_contrib_index(cran_url).get(pkg_name)
+    if record:
+        _, version, href = record
+        pkg_url = f"{cran_url}/src/contrib/Archive"
+        if pkg_version is None or pkg_version == version:
+            pkg_version = version
+            pkg_url = f"{cran_url}/src/contrib/{href}"
+        return pkg_name, pkg_version, pkg_url
     raise ValueError(
         f"It was not possible to find the package requested. pkg: {pkg_name}"
     )
 
 
+@lru_cache(maxsize=8)
+def get_cran_archive_index(archive_url: str) -> dict[str, str]:
+    """Index the package folders listed in the CRAN ``Archive`` page.
+
+    :return: dictionary mapping the lower-cased package name to the href of
+        its folder.
+    """
+    index = {}
+    for href, url_text in get_webpage(archive_url):
+        url_text = url_text.strip()
+        if url_text.endswith("/"):
+            index.setdefault(url_text[:-1].lower(), href)
+    return index
+
+
 def scrap_cran_archive_page_for_package_folder_url(cran_url: str, pkg_name: str):
-    for url_a in get_webpage(cran_url).findAll("a"):
-        if url_a.get_text().strip().lower() == f"{pkg_name.strip().lower()}/":
-            return f'{cran_url}/{url_a.get("href")}'
+    if href := get_cran_archive_index(cran_url).get(pkg_name.strip().lower()):
+        return f"{cran_url}/{href}"
     raise ValueError(
         f"It was not possible to find the package requested. pkg: {pkg_name}"
     )
@@ -214,30 +337,60 @@ def scrap_cran_archive_page_for_package_folder_url(cran_url: str, pkg_name: str)
 def scrap_cran_pkg_folder_page_for_full_url(
     cran_url: str, pkg_name: str, pkg_version: str
 ):
-    for url_a in get_webpage(cran_url).findAll("a"):
+    pkg_name = pkg_name.strip().lower()
+    for href, url_text in get_webpage(cran_url):
         try:
-            url_name, url_pkg_version = (
-                url_a.get_text().rsplit(".", 2)[0].rsplit("_", 1)
-            )
+            url_name, url_pkg_version = url_text.rsplit(".", 2)[0].rsplit("_", 1)
         except ValueError:
             continue
         url_name = url_name.strip().lower()
         url_pkg_version = url_pkg_version.strip().lower()
-        if pkg_name.strip().lower() == url_name and pkg_version == url_pkg_version:
-            return (
-                f"{cran_url}{'' if cran_url.endswith('/') else '/'}{url_a.get('href')}"
-            )
+        if pkg_name == url_name and pkg_version == url_pkg_version:
+            return f"{cran_url}{'' if cran_url.endswith('/') else '/'}{href}"
     raise ValueError("It was not possible to find the package requested")
 
 
-def get_webpage(cran_url):
-    req = Request(cran_url)
-    html_page = urlopen(req)
-    return BeautifulSoup(html_page, features="html.parser")
+@lru_cache(maxsize=32)
+def get_webpage(cran_url, modified_since: float | None = None):
+    """Download the given page and extract its links. The links are kept in
+    memory, so the Archive listings are fetched only once when several
+    packages are generated in the same run.
+
+    :param modified_since: timestamp sent as ``If-Modified-Since``
+    :return: list with the ``(href, text)`` of every anchor of the page, or
+        ``None`` if it was not modified since ``modified_since``
+    """
+    headers = {}
+    if modified_since is not None:
+        headers["If-Modified-Since"] = formatdate(modified_since, usegmt=True)
+    response = CRAN_SESSION.get(cran_url, headers=headers)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    # CRAN pages are plain directory listings, a regex over the anchors is
+    # enough and avoids building a document tree
+    content = response.content.decode("utf-8", errors="replace")
+    return [
+        (html.unescape(href), html.unescape(text))
+        for href, text in RE_ANCHOR.findall(content)
+    ]
+
+
+def cran_url_exists(url: str) -> bool:
+    """Check with a ``HEAD`` request if the given url exists on CRAN."""
+    try:
+        return CRAN_SESSION.head(url, allow_redirects=True).ok
+    except requests.RequestException:
+        return False
 
 
 def get_cran_index(cran_url: str, pkg_name: str, pkg_version: str | None = None):
-    """Fetch the entire CRAN index and store it."""
+    """Find the name, version and tarball url of a package in the CRAN index.
+
+    Only the ``src/contrib`` listing is needed for the current release of a
+    package, the ``Archive`` pages are fetched just when an older version was
+    requested.
+    """
     print_msg(f"Fetching main index from {cran_url}")
 
     name, version, url_page = scrap_main_page_cran_find_latest_package(
@@ -246,6 +399,13 @@ def get_cran_index(cran_url: str, pkg_name: str, pkg_version: str | None = None)
     if url_page.endswith(".tar.gz"):
         return name, version, url_page
 
+    # Archived tarballs have a predictable url, check it before scraping the
+    # large Archive listings
+    pkg_folder = get_cran_contrib_index(cran_url)[name][0]
+    archive_url = f"{url_page}/{pkg_folder}/{pkg_folder}_{version}.tar.gz"
+    if cran_url_exists(archive_url):
+        return name, version, archive_url
+
     url_page = scrap_cran_archive_page_for_package_folder_url(url_page, pkg_name)
     return (
         name,
@@ -262,30 +422,34 @@ def get_cran_metadata(config: Configuration, cran_url: str):
         config.name = config.name[2:]
     pkg_name = config.name
     pkg_version = str(config.version) if config.version else None
-    _, pkg_version, pkg_url = get_cran_index(cran_url, pkg_name, pkg_version)
+    requested_version = pkg_version
+    _, pkg_version, pkg_url = get_cran_index(cran_url, pkg_name, requested_version)
     print_msg(pkg_name)
     print_msg(pkg_version)
-    download_file = download_cran_pkg(config, pkg_url)
-    metadata = get_archive_metadata(download_file)
+    try:
+        metadata, sha256 = get_cran_pkg_metadata(pkg_url)
+    except requests.HTTPError as err:
+        if err.response is None or err.response.status_code != 404:
+            raise
+        # The cached index pointed to a tarball which was moved to the Archive
+        # by a newer release, resolve the package again with a fresh index
+        invalidate_cran_contrib_index(cran_url)
+        _, pkg_version, pkg_url = get_cran_index(cran_url, pkg_name, requested_version)
+        print_msg(pkg_version)
+        metadata, sha256 = get_cran_pkg_metadata(pkg_url)
     r_recipe_end_comment = "\n".join(
         [f"# {line}" for line in metadata["orig_lines"] if line]
     )
 
     print_msg(r_recipe_end_comment)
 
-    imports = []
     # Extract 'imports' from metadata.
     # Imports is equivalent to run and host dependencies.
     # Add 'r-' suffix to all packages listed in imports.
-    for s in metadata.get("Imports", "").split(","):
-        if not s.strip():
-            continue
-        r = s.split("(")
-        if len(r) == 1:
-            imports.append(f"r-{r[0].strip()}")
-        else:
-            constrain = r[1].strip().replace(")", "").replace(" ", "")
-            imports.append(f"r-{r[0].strip()} {constrain.strip()}")
+    imports = [
+        f"r-{name} {constrain.replace(' ', '')}" if constrain else f"r-{name}"
+        for name, constrain in RE_IMPORT.findall(metadata.get("Imports", ""))
+    ]
 
     # Every CRAN package will always depend on the R base package.
     # Hence, the 'r-base' package is always present
@@ -300,7 +464,7 @@ def get_cran_metadata(config: Configuration, cran_url: str):
         },
         "source": {
             "url": pkg_url.replace(pkg_version, "{{ version }}"),
-            "sha256": sha256_checksum(download_file),
+            "sha256": sha256,
         },
         "build": {
             "number": 0,
@@ -348,14 +512,167 @@ def get_cran_metadata(config: Configuration, cran_url: str):
     return dict_metadata, r_recipe_end_comment
 
 
-def download_cran_pkg(config, pkg_url):
+def read_cran_tarball(fileobj, copy_to=None) -> tuple[dict, str]:
+    """Read the DESCRIPTION of a CRAN tarball in a single sequential pass.
+
+    :param fileobj: file object with the ``.tar.gz`` content
+    :param copy_to: file object to write a copy of the tarball to
+    :return: DESCRIPTION metadata and the sha256 of the tarball
+    """
+    reader = HashingReader(fileobj, copy_to)
+    metadata = None
+    if libarchive is not None:
+        # libarchive walks the tar headers in C, without the per-member
+        # overhead of the tarfile module
+        with libarchive.stream_reader(reader, "tar", "gzip") as archive:
+            for entry in archive:
+                if is_description_member(entry.pathname):
+                    content = b"".join(entry.get_blocks())
+                    metadata = parse_description(content)
+                    break
+    else:
+        with ExitStack() as stack:
+            if igzip is not None:
+                # ISA-L inflates several times faster than the stdlib zlib
+                fileobj = stack.enter_context(igzip.IGzipFile(fileobj=reader))
+                mode = "r|"
+            else:
+                fileobj, mode = reader, "r|gz"
+            # read the stream in large blocks instead of tarfile's 10 KiB records
+            tf = stack.enter_context(
+                tarfile.open(fileobj=fileobj, mode=mode, bufsize=1 << 20)
+            )
+            for member in tf:
+                if is_description_member(member.name):
+                    metadata = read_description_contents(tf.extractfile(member))
+                    break
+    if metadata is None:
+        sys.exit("The tarball does not seem to be a CRAN package (no DESCRIPTION)")
+    reader.drain()
+    return metadata, reader.hash.hexdigest()
+
+
+def get_cran_pkg_metadata(pkg_url: str) -> tuple[dict, str]:
+    """Get the DESCRIPTION metadata and the sha256 of the CRAN package.
+
+    The tarball is streamed from CRAN straight into the tar reader while it is
+    hashed and stored in the local cache. The metadata and the sha256 are
+    cached as well, so a previous run for the same tarball spares both the
+    download and the reading of the archive. Tarballs are cached per CRAN
+    repository and their total size is limited to ``CRAN_CACHE_MAX_SIZE``.
+    """
     tarball_name = pkg_url.rsplit("/", 1)[-1]
+    # The same tarball name can come from different CRAN mirrors or custom
+    # repositories, keep each repository in its own folder
+    repo_url = pkg_url.split("/src/contrib/", 1)[0]
+    repo_hash = hashlib.sha256(repo_url.encode()).hexdigest()[:16]
+    download_file = get_cache_dir("cran", repo_hash) / tarball_name
+    metadata_file = download_file.with_name(f"{tarball_name}.json")
+    if metadata_file.is_file():
+        if cached := _read_cran_metadata_cache(metadata_file, download_file):
+            print_msg(f"Using cached {metadata_file}")
+            return cached
+        log.debug(f"Ignoring outdated or invalid cache {metadata_file}")
+    if download_file.is_file():
+        print_msg(f"Using cached {download_file}")
+        with open(download_file, "rb") as f:
+            metadata, sha256 = read_cran_tarball(f)
+        _write_cran_metadata_cache(metadata_file, download_file, metadata, sha256)
+        return metadata, sha256
     print_msg(pkg_url)
-    response = requests.get(pkg_url)
-    response.raise_for_status()
-    download_file = os.path.join(
-        str(mkdtemp(f"grayskull-cran-metadata-{config.name}-")), tarball_name
+    partial_file = None
+    try:
+        with CRAN_SESSION.get(pkg_url, stream=True) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            with _partial_cache_file(download_file, "wb") as f:
+                partial_file = Path(f.name)
+                metadata, sha256 = read_cran_tarball(response.raw, copy_to=f)
+    except BaseException:
+        # do not leave a truncated tarball behind in the cache folder
+        if partial_file is not None:
+            partial_file.unlink(missing_ok=True)
+        raise
+    os.replace(partial_file, download_file)
+    _write_cran_metadata_cache(metadata_file, download_file, metadata, sha256)
+    prune_cran_cache(CRAN_CACHE_MAX_SIZE)
+    return metadata, sha256
+
+
+def _write_cran_metadata_cache(
+    metadata_file, download_file, metadata: dict, sha256: str
+):
+    # The size and mtime of the tarball tell if it changed since it was hashed
+    stat = download_file.stat()
+    _write_json_cache(
+        metadata_file,
+        {
+            "version": CRAN_METADATA_CACHE_VERSION,
+            "sha256": sha256,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "description": metadata,
+        },
     )
-    with open(download_file, "wb") as f:
-        f.write(response.content)
-    return download_file
+
+
+def _read_cran_metadata_cache(metadata_file, download_file) -> tuple[dict, str] | None:
+    """Read the cached DESCRIPTION metadata and sha256 of a tarball.
+
+    The tarball is only hashed again if its size or mtime changed since the
+    cache was written.
+
+    :return: None if the cache was written in another format, is corrupted or
+        if its sha256 does not match the cached tarball.
+    """
+    try:
+        with open(metadata_file) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        not isinstance(cached, dict)
+        or cached.get("version") != CRAN_METADATA_CACHE_VERSION
+        or not isinstance(cached.get("sha256"), str)
+        or not isinstance(cached.get("description"), dict)
+        or "orig_lines" not in cached["description"]
+    ):
+        return None
+    if download_file.is_file():
+        stat = download_file.stat()
+        if (stat.st_size, stat.st_mtime_ns) != (
+            cached.get("size"),
+            cached.get("mtime_ns"),
+        ):
+            if sha256_checksum(download_file) != cached["sha256"]:
+                return None
+            _write_cran_metadata_cache(
+                metadata_file, download_file, cached["description"], cached["sha256"]
+            )
+    # Mark the package as recently used for prune_cran_cache
+    metadata_file.touch()
+    return cached["description"], cached["sha256"]
+
+
+def prune_cran_cache(max_size: int):
+    """Remove the least recently used tarballs, and their cached metadata,
+    until the tarballs in the CRAN cache take at most ``max_size`` bytes.
+
+    The cached metadata is touched on each use, so its mtime tells when the
+    package was last used.
+    """
+    tarballs = []
+    for tarball in get_cache_dir("cran").glob("*/*.tar.gz"):
+        stat = tarball.stat()
+        last_used = stat.st_mtime
+        metadata_file = tarball.with_name(f"{tarball.name}.json")
+        if metadata_file.is_file():
+            last_used = max(last_used, metadata_file.stat().st_mtime)
+        tarballs.append((last_used, stat.st_size, tarball))
+    total_size = sum(size for _, size, _ in tarballs)
+    for _, size, tarball in sorted(tarballs):
+        if total_size <= max_size:
+            break
+        tarball.unlink(missing_ok=True)
+        tarball.with_name(f"{tarball.name}.json").unlink(missing_ok=True)
+        total_size -= size
@@ -1,22 +1,17 @@
 import re
+from functools import lru_cache
 
 from packaging.version import Version
 
-VERSION_REGEX = re.compile(
-    r"""^[vV]?
-        (?P<major>0|[1-9]\d*)
-        (\.
-        (?P<minor>0|[1-9]\d*)
-        (\.
-            (?P<patch>0|[1-9]\d*)
-        )?
-        )?$
-    """,
-    re.VERBOSE,
+VERSION_REGEX = re.compile(r"[vV]?(0|[1-9]\d*)(?:\.(0|[1-9]\d*)(?:\.(0|[1-9]\d*))?)?\Z")
+
+# Regex to split an optional operator and a whatever version
+VERSION_SPECIFIER_REGEX = re.compile(
+    r"(?P<operator>\^|~=|~|>=|<=|>|<|!=|===|==|=)?(?P<version>.+)\Z"
 )
 
 
-class InvalidVersion(BaseException):
+class InvalidVersion(Exception):
     pass
 
 
@@ -34,13 +29,15 @@ def parse_version(version: str) -> dict[str, int | None]:
     >>> parse_version("1.2.3")
     {'major': 1, 'minor': 2, 'patch': 3}
     """
-    match = VERSION_REGEX.search(version)
+    match = VERSION_REGEX.match(version)
     if not match:
         raise InvalidVersion(f"Could not parse version {version}.")
 
+    major, minor, patch = match.groups()
     return {
-        key: None if value is None else int(value)
-        for key, value in match.groupdict().items()
+        "major": int(major),
+        "minor": None if minor is None else int(minor),
+        "patch": None if patch is None else int(patch),
     }
 
 
@@ -154,6 +151,7 @@ def get_tilde_ceiling(version: str | Version) -> str:
     return tilde_ceiling
 
 
+@lru_cache(maxsize=1024)
 def encode_poetry_version(poetry_specifier: str) -> str:
     """
     Encodes Poetry version specifier as a Conda version specifier.
@@ -226,6 +224,10 @@ def encode_poetry_version(poetry_specifier: str) -> str:
     >>> encode_poetry_version("^5|| ^6 | ^7")
     '>=5.0.0,<6.0.0|>=6.0.0,<7.0.0|>=7.0.0,<8.0.0'
     """
+    if not any(operator in poetry_specifier for operator in "^~|"):
+        # already conda compatible, only the spaces have to go
+        return poetry_specifier.replace(" ", "")
+
     if "|" in poetry_specifier:
         poetry_or_clauses = [clause.strip() for clause in poetry_specifier.split("|")]
         conda_or_clauses = [
@@ -257,7 +259,7 @@ def encode_poetry_version(poetry_specifier: str) -> str:
 
         if poetry_clause.startswith("~"):
             # handle ~ operator
-            tilde_version = poetry_clause[1:]
+            tilde_version = Version(poetry_clause[1:])
             floor = get_padded_base_version(tilde_version)
             ceiling = get_tilde_ceiling(tilde_version)
             conda_clauses.append(">=" + floor)
@@ -285,6 +287,7 @@ def encode_poetry_platform_to_selector_item(poetry_platform: str) -> str:
         return ""
 
 
+@lru_cache(maxsize=1024)
 def encode_poetry_python_version_to_selector_item(poetry_specifier: str) -> str:
     """
     Encodes Poetry Python version specifier set as a Conda selector.
@@ -378,6 +381,7 @@ def encode_poetry_python_version_to_selector_item(poetry_specifier: str) -> str:
     return selectors
 
 
+@lru_cache(maxsize=1024)
 def parse_python_version_specifier_to_selector(version_specifier: str):
     """
     Take a Python version specifier, PEP 440 compliant.
@@ -428,14 +432,11 @@ def parse_python_version_specifier_to_selector(version_specifier: str):
     'py<3 or py>=4'
 
     """
-    # Regex to split an optional operator and a whatever version
-    pattern = r"^(?P<operator>\^|~=|~|>=|<=|>|<|!=|===|==|=)?(?P<version>.+)$"
-
     # Here Specifier or Version are not useful because
     # Specifier requires an operator, and Version cannot
     # accept an operator. Doomed to match twice.
 
-    match = re.match(pattern, version_specifier)
+    match = VERSION_SPECIFIER_REGEX.match(version_specifier)
     if not match:
         raise ValueError(f"Invalid version selector: {version_specifier}")
 
@@ -1,26 +1,32 @@
 from __future__ import annotations
 
+import ast
+import hashlib
+import importlib
 import logging
 import os
 import re
 import shutil
 import sys
+import tarfile
 from collections import defaultdict
 from contextlib import AbstractContextManager, contextmanager
 from copy import deepcopy
 from distutils import core
-from glob import glob
+from functools import lru_cache
 from pathlib import Path
 from subprocess import check_output
-from tempfile import mkdtemp
+from tempfile import TemporaryDirectory, mkdtemp
 from urllib.parse import urlparse
 
 import requests
 from colorama import Fore, Style
 from packaging.specifiers import SpecifierSet
-from packaging.utils import canonicalize_version
-from packaging.version import Version
+from packaging.utils import canonicalize_name, canonicalize_version
+from packaging.version import InvalidVersion, Version
 from pkginfo import UnpackedSDist
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 from grayskull.cli.stdout import manage_progressbar, print_msg
 from grayskull.config import Configuration
@@ -28,6 +34,7 @@ from grayskull.license.discovery import ShortLicense, search_license_file
 from grayskull.strategy.py_toml import get_all_toml_info
 from grayskull.utils import (
     RE_PEP725_PURL,
+    HashingReader,
     PyVer,
     get_vendored_dependencies,
     merge_dict_of_lists_item,
@@ -43,26 +50,106 @@ else:
 
 log = logging.getLogger(__name__)
 RE_DEPS_NAME = re.compile(r"^\s*([\.a-zA-Z0-9_-]+)", re.MULTILINE)
+RE_PY_SELECTOR = re.compile(r"#\s+\[py\s*(?:([<>=!]+))?\s*(\d+)\]\s*$", re.DOTALL)
+RE_EXTRA_METADATA = re.compile(
+    r"(?:(\())?\s*([\.a-zA-Z0-9-_]+)\s*([=!<>]+)\s*[\'\"]*"
+    r"([\.a-zA-Z0-9-_]+)[\'\"]*\s*(?:(\)))?\s*(?:(and|or))?"
+)
+RE_REQUIRES_DIST = re.compile(r"^\s*([^\s]+)\s*([\(]*.*[\)]*)?\s*", re.DOTALL)
+RE_PARENTHESES = re.compile(r"[\(\)]")
+RE_REQUIRES_PYTHON = re.compile(r"([~><=!]+)\s*(\d+)(?:\.(\d+))?")
+RE_COMPILER = re.compile(
+    r"^\s*[<{]\{\s*compiler\(['\"]\w+['\"]\)\s*\}\}\s*$", re.MULTILINE
+)
+RE_DEP_NAME_SPLIT = re.compile(r"\s+|>|=|<|~|!")
+RE_DEP_OPERATOR = re.compile(r"([><!=~^]+)")
+DEP_OPERATOR_CHARS = frozenset("><!=~^")
+RE_NON_ALPHA = re.compile(r"[^a-zA-Z]+")
+RE_ENTRY_POINT_SECTION = re.compile(r"\[\s*([A-Za-z0-9_-]+)\s*\]")
+RE_ENTRY_POINT_LINE = re.compile(
+    r"""([A-Za-z0-9_-]+)\s*=\s*(?:"([^"\\]*)"|'([^']*)'|([^'"=]*?))\s*"""
+)
+PY27 = PyVer(2, 7)
+PLATFORM_SELECTOR = {"windows": "win", "linux": "linux", "darwin": "osx"}
 PIN_PKG_COMPILER = {"numpy": "<{ pin_compatible('numpy') }}"}
 
+# Shared session, the metadata and the sdists come from a couple of PyPI hosts
+# so keep-alive connections avoid a new TCP/TLS handshake per request.
+PYPI_SESSION = requests.Session()
+_pypi_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3),
+)
+PYPI_SESSION.mount("https://", _pypi_adapter)
+PYPI_SESSION.mount("http://", _pypi_adapter)
+
 
 def search_setup_root(path_folder: Path | str) -> Path:
-    if setup_py := list(Path(path_folder).rglob("setup.py")):
-        return setup_py[0]
-    if setup_cfg := list(Path(path_folder).rglob("setup.cfg")):
-        return setup_cfg[0]
-    if pyproject_toml := list(Path(path_folder).rglob("pyproject.toml")):
-        return pyproject_toml[0]
+    # A single walk over the tree, a setup.py anywhere still takes precedence
+    # over setup.cfg, which takes precedence over pyproject.toml
+    found = {}
+    for root, _, files in os.walk(path_folder):
+        if "setup.py" in files:
+            return Path(root) / "setup.py"
+        for name in ("setup.cfg", "pyproject.toml"):
+            if name in files and name not in found:
+                found[name] = Path(root) / name
+    return found.get("setup.cfg") or found.get("pyproject.toml")
+
+
+def find_sdist_files(path_folder: Path | str, names: tuple[str, ...]) -> dict:
+    """Find the first file for each of the given names with a single walk
+    over the folder, the walk stops as soon as all of them are found.
+
+    :param path_folder: folder where the sdist was unpacked
+    :param names: file names to look for
+    :return: dict mapping the names found to their path
+    """
+    found = {}
+    for root, _, files in os.walk(path_folder):
+        for name in names:
+            if name not in found and name in files:
+                found[name] = Path(root) / name
+        if len(found) == len(names):
+            break
+    return found
+
+
+def find_egg_info_top_level(path_folder: Path | str) -> Path | None:
+    """Find the ``top_level.txt`` file inside the ``*.egg-info`` folder of an
+    unpacked sdist. Setuptools places the egg-info next to ``setup.py``, in
+    the sdist root folder, so that level is checked before walking the tree.
+
+    :param path_folder: folder where the sdist was unpacked
+    :return: path to ``top_level.txt`` or None if it was not found
+    """
+    path_folder = Path(path_folder)
+    return next(path_folder.glob("*/*.egg-info/top_level.txt"), None) or next(
+        path_folder.rglob("*.egg-info/top_level.txt"), None
+    )
+
+
+@lru_cache(maxsize=128)
+def _py_version(major: int, minor: int) -> Version:
+    return Version(f"{major}.{minor}")
+
+
+@lru_cache(maxsize=128)
+def _specifier_set(operator: str, major: int, minor: int) -> SpecifierSet:
+    return SpecifierSet(f"{operator}{major}.{minor}")
 
 
 def clean_deps_for_conda_forge(list_deps: list, py_ver_min: PyVer) -> list:
     """Remove dependencies which conda-forge is not supporting anymore.
     For example Python 2.7, Python version less than 3.6"""
-    re_delimiter = re.compile(r"#\s+\[py\s*(?:([<>=!]+))?\s*(\d+)\]\s*$", re.DOTALL)
     result_deps = []
+    py_ver_min_version = _py_version(py_ver_min.major, py_ver_min.minor)
+    lt_py_ver_min = _specifier_set("<", py_ver_min.major, py_ver_min.minor)
     for dependency in list_deps:
-        match_del = re_delimiter.search(dependency)
-        if match_del is None:
+        # Cheap check first, most of the dependencies do not have a selector
+        match_del = "[py" in dependency and RE_PY_SELECTOR.search(dependency)
+        if not match_del:
             result_deps.append(dependency)
             continue
 
@@ -71,13 +158,12 @@ def clean_deps_for_conda_forge(list_deps: list, py_ver_min: PyVer) -> list:
             match_del = ("==", match_del[1])
         major = int(match_del[1][0])
         minor = int(match_del[1][1:].replace("k", "0") or 0)
-        py_ver_min = Version(f"{py_ver_min.major}.{py_ver_min.minor}")
-        current_py = SpecifierSet(f"{match_del[0]}{major}.{minor}")
-        log.debug(f"Evaluating: {py_ver_min}{match_del}{current_py} -- {dependency}")
-        if py_ver_min in current_py:
-            if Version(f"{major}.{minor}") in SpecifierSet(
-                f"<{py_ver_min.major}.{py_ver_min.minor}"
-            ):
+        current_py = _specifier_set(match_del[0], major, minor)
+        log.debug(
+            f"Evaluating: {py_ver_min_version}{match_del}{current_py} -- {dependency}"
+        )
+        if py_ver_min_version in current_py:
+            if _py_version(major, minor) in lt_py_ver_min:
                 result_deps.append(dependency.split("#")[0].strip())
             else:
                 result_deps.append(dependency)
@@ -108,15 +194,13 @@ def parse_extra_metadata_to_selector(option: str, operation: str, value: str) ->
         value = "".join(value[:2])
         return f"py{operation}{value}"
     if option == "sys_platform":
-        value = re.sub(r"[^a-zA-Z]+", "", value)
+        value = RE_NON_ALPHA.sub("", value)
         if operation == "!=":
             return f"not {value.lower()}"
         return value.lower()
     if option == "platform_system":
-        replace_val = {"windows": "win", "linux": "linux", "darwin": "osx"}
         value_lower = value.lower().strip()
-        if value_lower in replace_val:
-            value_lower = replace_val[value_lower]
+        value_lower = PLATFORM_SELECTOR.get(value_lower, value_lower)
         if operation == "!=":
             return f"not {value_lower}"
         return value_lower
@@ -129,11 +213,7 @@ def get_extra_from_requires_dist(string_parse: str) -> list:
     :param string_parse: metadata extra
     :return: return the option , operation and value of the extra metadata
     """
-    return re.findall(
-        r"(?:(\())?\s*([\.a-zA-Z0-9-_]+)\s*([=!<>]+)\s*[\'\"]*"
-        r"([\.a-zA-Z0-9-_]+)[\'\"]*\s*(?:(\)))?\s*(?:(and|or))?",
-        string_parse,
-    )
+    return RE_EXTRA_METADATA.findall(string_parse)
 
 
 def get_name_version_from_requires_dist(string_parse: str) -> tuple[str, str]:
@@ -143,12 +223,12 @@ def get_name_version_from_requires_dist(string_parse: str) -> tuple[str, str]:
     :param string_parse: requires_dist value from PyPi metadata
     :return: Name and version of a package
     """
-    pkg = re.match(r"^\s*([^\s]+)\s*([\(]*.*[\)]*)?\s*", string_parse, re.DOTALL)
+    pkg = RE_REQUIRES_DIST.match(string_parse)
     pkg_name = pkg.group(1).strip()
     version = ""
     if len(pkg.groups()) > 1 and pkg.group(2):
         version = " " + pkg.group(2).strip()
-    return pkg_name.strip(), re.sub(r"[\(\)]", "", version).strip()
+    return pkg_name.strip(), RE_PARENTHESES.sub("", version).strip()
 
 
 def generic_py_ver_to(
@@ -160,10 +240,7 @@ def generic_py_ver_to(
     # TODO: Refactor the entire function to use LooseVersion instead of custom PyVer
     if not metadata.get("requires_python"):
         return None
-    req_python = re.findall(
-        r"([~><=!]+)\s*(\d+)(?:\.(\d+))?",
-        metadata["requires_python"],
-    )
+    req_python = RE_REQUIRES_PYTHON.findall(metadata["requires_python"])
     if not req_python:
         return None
 
@@ -172,26 +249,37 @@ def generic_py_ver_to(
         [k for k, v in py_ver_enabled.items() if v]
     )
     all_py = list(py_ver_enabled.values())
-    if all(all_py):
+    # suffix_all[pos] == all(all_py[pos:]), suffix_any[pos] == any(all_py[pos:])
+    # and prefix_any[pos] == any(all_py[:pos]), computed in one pass each
+    suffix_all = [True] * (len(all_py) + 1)
+    suffix_any = [False] * (len(all_py) + 1)
+    for pos in range(len(all_py) - 1, -1, -1):
+        suffix_all[pos] = suffix_all[pos + 1] and all_py[pos]
+        suffix_any[pos] = suffix_any[pos + 1] or all_py[pos]
+    prefix_any = [False] * (len(all_py) + 1)
+    for pos, is_enabled in enumerate(all_py):
+        prefix_any[pos + 1] = prefix_any[pos] or is_enabled
+
+    if suffix_all[0]:
         return None
-    if all(all_py if config.is_strict_cf else all_py[1:]):
+    if suffix_all[0 if config.is_strict_cf else 1]:
         if is_selector:
             return None if config.is_strict_cf else "# [py2k]"
         else:
             return f">={small_py3_version.major}.{small_py3_version.minor}"
-    if py_ver_enabled.get(PyVer(2, 7)) and any(all_py[1:]) is False:
+    if py_ver_enabled.get(PY27) and not suffix_any[1]:
         return "# [py3k]" if is_selector else "<3.0"
 
     for pos, py_ver in enumerate(py_ver_enabled):
-        if py_ver == PyVer(2, 7):
+        if py_ver == PY27:
             continue
-        if all(all_py[pos:]) and any(all_py[:pos]) is False:
+        if suffix_all[pos] and not prefix_any[pos]:
             if is_selector:
                 minor = f"{py_ver.minor:02d}" if py_ver.major >= 4 else py_ver.minor
                 return f"# [py<{py_ver.major}{minor}]"
             else:
                 return f">={py_ver.major}.{py_ver.minor}"
-        elif any(all_py[pos:]) is False:
+        elif not suffix_any[pos]:
             if is_selector:
                 py2k = ""
                 if not config.is_strict_cf and not all_py[0]:
@@ -224,8 +312,8 @@ def install_deps_if_necessary(setup_path: str, data_dist: dict, pip_dir: str):
     :param pip_dir: path where the missing packages will be downloaded
     """
     all_setup_deps = get_vendored_dependencies(setup_path)
-    for dep in all_setup_deps:
-        pip_install_dep(data_dist, dep, pip_dir)
+    if all_setup_deps:
+        pip_install_deps(data_dist, all_setup_deps, pip_dir)
 
 
 def pip_install_dep(data_dist: dict, dep_name: str, pip_dir: str):
@@ -235,33 +323,45 @@ def pip_install_dep(data_dist: dict, dep_name: str, pip_dir: str):
     :param dep_name: Package name which will be installed
     :param pip_dir: Path to the folder where `pip` will let the packages
     """
+    pip_install_deps(data_dist, [dep_name], pip_dir)
+
+
+def pip_install_deps(data_dist: dict, dep_names: list[str], pip_dir: str):
+    """Install dependencies using a single `pip` call. If that fails they are
+    installed one by one, to keep the ones which can be installed.
+
+    :param data_dist: sdist metadata
+    :param dep_names: Package names which will be installed
+    :param pip_dir: Path to the folder where `pip` will let the packages
+    """
     if not data_dist.get("setup_requires"):
         data_dist["setup_requires"] = []
-    if dep_name == "pkg_resources":
-        dep_name = "setuptools"
+    all_deps = list(
+        dict.fromkeys(
+            "setuptools" if dep == "pkg_resources" else dep for dep in dep_names
+        )
+    )
     try:
         check_output(
-            [
-                sys.executable,
-                "-m",
-                "pip",
-                "install",
-                dep_name,
-                f"--target={pip_dir}",
-            ]
+            [sys.executable, "-m", "pip", "install", *all_deps, f"--target={pip_dir}"]
         )
     except Exception as err:
+        if len(all_deps) > 1:
+            for dep in all_deps:
+                pip_install_deps(data_dist, [dep], pip_dir)
+            return
         log.error(
-            f"It was not possible to install {dep_name}.\n"
-            f"Command: pip install {dep_name} --target={pip_dir}.\n"
+            f"It was not possible to install {' '.join(all_deps)}.\n"
+            f"Command: pip install {' '.join(all_deps)} --target={pip_dir}.\n"
             f"Error: {err}"
         )
     else:
-        if (
-            dep_name.lower() not in data_dist["setup_requires"]
-            and dep_name.lower() != "setuptools"
-        ):
-            data_dist["setup_requires"].append(dep_name.lower())
+        for dep in all_deps:
+            if (
+                dep.lower() not in data_dist["setup_requires"]
+                and dep.lower() != "setuptools"
+            ):
+                data_dist["setup_requires"].append(dep.lower())
 
 
 def merge_sdist_metadata(setup_py: dict, setup_cfg: dict) -> dict:
@@ -272,7 +372,11 @@ def merge_sdist_metadata(setup_py: dict, setup_cfg: dict) -> dict:
     :param setup_cfg: Metadata from setup.cfg
     :return: Return the merged data from setup.py and setup.cfg
     """
-    result = deepcopy(setup_py)
+    # one level copy is enough, the nested lists are replaced and not updated
+    result = {
+        key: value.copy() if isinstance(value, list | dict) else value
+        for key, value in setup_py.items()
+    }
     for key, value in setup_cfg.items():
         if key not in result:
             result[key] = value
@@ -295,20 +399,27 @@ def get_setup_cfg(source_path: str) -> dict:
      files unpacked
     :return: Metadata of setup.cfg
     """
+    log.debug(f"Started setup.cfg from {source_path}")
+    print_msg("Recovering metadata from setup.cfg")
+    path_setup_cfg = find_sdist_files(source_path, ("setup.cfg",)).get("setup.cfg")
+    if path_setup_cfg is None:
+        return {}
+    path_setup_cfg = path_setup_cfg.resolve()
+    # The cached result is copied as the callers update the returned data
+    return deepcopy(
+        _read_setup_cfg(str(path_setup_cfg), path_setup_cfg.stat().st_mtime_ns)
+    )
+
+
+@lru_cache(maxsize=64)
+def _read_setup_cfg(path_setup_cfg: str, mtime_ns: int) -> dict:
+    # mtime_ns is only part of the cache key, to refresh if the file changes
     try:
         from setuptools.config.setupcfg import read_configuration
     except ImportError:
         from setuptools.config import read_configuration
 
-    log.debug(f"Started setup.cfg from {source_path}")
-    print_msg("Recovering metadata from setup.cfg")
-    path_setup_cfg = list(Path(source_path).rglob("setup.cfg"))
-    if not path_setup_cfg:
-        return {}
-    path_setup_cfg = path_setup_cfg[0]
-
-    setup_cfg = read_configuration(str(path_setup_cfg))
-    setup_cfg = dict(setup_cfg)
+    setup_cfg = dict(read_configuration(path_setup_cfg))
     if setup_cfg.get("options", {}).get("python_requires"):
         setup_cfg["options"]["python_requires"] = ensure_pep440(
             str(setup_cfg["options"]["python_requires"])
@@ -322,6 +433,86 @@ def get_setup_cfg(source_path: str) -> dict:
     return result
 
 
+def has_static_requirements(pkg_info: UnpackedSDist) -> bool:
+    """Check if the core metadata (2.2 or newer) of the sdist declares its
+    requirements as static, in other words ``Requires-Dist`` and
+    ``Provides-Extra`` are not marked as ``Dynamic``.
+    """
+    try:
+        metadata_version = Version(pkg_info.metadata_version or "")
+    except InvalidVersion:
+        return False
+    dynamic = {field.lower() for field in getattr(pkg_info, "dynamic", ()) or ()}
+    return metadata_version >= Version("2.2") and not dynamic & {
+        "requires-dist",
+        "provides-extra",
+    }
+
+
+def _is_bare_setup_statement(node: ast.stmt) -> bool:
+    if isinstance(node, ast.ImportFrom):
+        return (node.module or "").split(".")[0] in ("setuptools", "distutils")
+    if isinstance(node, ast.Import):
+        return all(
+            alias.name.split(".")[0] in ("setuptools", "distutils")
+            for alias in node.names
+        )
+    if isinstance(node, ast.Expr):
+        if isinstance(node.value, ast.Constant):  # docstring
+            return True
+        call = node.value
+        return (
+            isinstance(call, ast.Call)
+            and not call.args
+            and not call.keywords
+            and getattr(call.func, "id", getattr(call.func, "attr", None)) == "setup"
+        )
+    if isinstance(node, ast.If):  # if __name__ == "__main__":
+        return not node.orelse and all(map(_is_bare_setup_statement, node.body))
+    return False
+
+
+def is_setup_py_declarative(path_setup: Path | None) -> bool:
+    """Check if there is nothing to recover from running the setup.py, which
+    is the case when there is no setup.py at all or when it only calls
+    ``setup()`` without arguments. The metadata is then declared in
+    ``setup.cfg`` or ``pyproject.toml``.
+    """
+    if path_setup is None or path_setup.name != "setup.py":
+        return True
+    try:
+        tree = ast.parse(path_setup.read_bytes())
+    except (SyntaxError, ValueError):
+        return False
+    return all(map(_is_bare_setup_statement, tree.body))
+
+
+def get_requirements_from_pkg_info(pkg_info: UnpackedSDist) -> dict:
+    """Recover ``install_requires`` and ``extras_require`` from the
+    ``Requires-Dist`` entries of the PKG-INFO. Requirements guarded by an
+    ``extra`` marker are moved to ``extras_require`` without their marker.
+    """
+    install_requires = []
+    extras_require = defaultdict(list)
+    for requirement in getattr(pkg_info, "requires_dist", ()) or ():
+        dep, _, marker = requirement.partition(";")
+        extras = [
+            value
+            for _, option, operation, value, *_ in get_extra_from_requires_dist(marker)
+            if option == "extra" and operation == "=="
+        ]
+        if not extras:
+            install_requires.append(requirement.strip())
+        for extra in extras:
+            extras_require[extra].append(dep.strip())
+    result = {}
+    if install_requires:
+        result["install_requires"] = install_requires
+    if extras_require:
+        result["extras_require"] = dict(extras_require)
+    return result
+
+
 @contextmanager
 def injection_distutils(folder: str) -> AbstractContextManager[dict]:
     """This is a bit of "dark magic", please don't do it at home.
@@ -432,43 +623,50 @@ def __run_setup_py(path_setup: str, data_dist: dict, run_py=False, deps_installe
     invoking the distutils directly
     """
     deps_installed = deps_installed or []
-    original_path = deepcopy(sys.path)
-    pip_dir = mkdtemp(prefix="pip-dir-")
-    if not os.path.exists(pip_dir):
-        os.mkdir(pip_dir)
-    if os.path.dirname(path_setup) not in sys.path:
-        sys.path.append(os.path.dirname(path_setup))
-        sys.path.append(pip_dir)
-    install_deps_if_necessary(path_setup, data_dist, pip_dir)
-    try:
-        if run_py:
-            import runpy
-
-            data_dist["run_py"] = True
-            runpy.run_path(path_setup, run_name="__main__")
-        else:
-            core.run_setup(path_setup, script_args=["install", f"--target={pip_dir}"])
-    except ModuleNotFoundError as err:
-        log.debug(
-            f"When executing setup.py did not find the module: {err.name}."
-            f" Exception: {err}"
-        )
-        dep_install = err.name
-        if dep_install in deps_installed:
-            dep_install = dep_install.split(".")[0]
-        if dep_install not in deps_installed:
-            deps_installed.append(dep_install)
-            pip_install_dep(data_dist, dep_install, pip_dir)
-            __run_setup_py(path_setup, data_dist, run_py, deps_installed=deps_installed)
-    except Exception as err:
-        log.debug(f"Exception when executing setup.py as script: {err}")
-    data_dist.update(
-        merge_sdist_metadata(data_dist, get_setup_cfg(os.path.dirname(str(path_setup))))
-    )
-    log.debug(f"Data recovered from setup.py: {data_dist}")
-    if os.path.exists(pip_dir):
-        shutil.rmtree(pip_dir)
-    sys.path = original_path
+    original_path = sys.path[:]
+    with TemporaryDirectory(prefix="pip-dir-", ignore_cleanup_errors=True) as pip_dir:
+        try:
+            if os.path.dirname(path_setup) not in sys.path:
+                sys.path.append(os.path.dirname(path_setup))
+            sys.path.append(pip_dir)
+            install_deps_if_necessary(path_setup, data_dist, pip_dir)
+            while True:
+                try:
+                    if run_py:
+                        import runpy
+
+                        data_dist["run_py"] = True
+                        runpy.run_path(path_setup, run_name="__main__")
+                    else:
+                        core.run_setup(
+                            path_setup, script_args=["install", f"--target={pip_dir}"]
+                        )
+                except ModuleNotFoundError as err:
+                    log.debug(
+                        f"When executing setup.py did not find the module:"
+                        f" {err.name}. Exception: {err}"
+                    )
+                    dep_install = err.name or ""
+                    if dep_install in deps_installed:
+                        dep_install = dep_install.split(".")[0]
+                    if dep_install and dep_install not in deps_installed:
+                        # Retry in the same process and pip folder, the
+                        # dependencies already installed are kept
+                        deps_installed.append(dep_install)
+                        pip_install_dep(data_dist, dep_install, pip_dir)
+                        importlib.invalidate_caches()
+                        continue
+                except Exception as err:
+                    log.debug(f"Exception when executing setup.py as script: {err}")
+                break
+            data_dist.update(
+                merge_sdist_metadata(
+                    data_dist, get_setup_cfg(os.path.dirname(str(path_setup)))
+                )
+            )
+            log.debug(f"Data recovered from setup.py: {data_dist}")
+        finally:
+            sys.path = original_path
 
 
 def get_compilers(
@@ -499,14 +697,14 @@ def get_py_multiple_selectors(
     :return: list with all selectors or constrained python
     """
     all_selector = []
-    if not config.is_strict_cf and selectors[PyVer(2, 7)] is False:
+    if not config.is_strict_cf and selectors[PY27] is False:
         all_selector += (
             ["py2k"]
             if is_selector
             else config.get_oldest_py3_version(list(selectors.keys()))
         )
     for py_ver, is_enabled in selectors.items():
-        if (not config.is_strict_cf and py_ver == PyVer(2, 7)) or is_enabled:
+        if (not config.is_strict_cf and py_ver == PY27) or is_enabled:
             continue
         all_selector += (
             [f"py=={py_ver.major}{py_ver.minor}"]
@@ -540,10 +738,10 @@ def update_requirements_with_pin(requirements: dict):
     def is_compiler_present() -> bool:
         if "build" not in requirements:
             return False
-        re_compiler = re.compile(
-            r"^\s*[<{]\{\s*compiler\(['\"]\w+['\"]\)\s*\}\}\s*$", re.MULTILINE
+        return any(
+            "compiler(" in build and RE_COMPILER.match(build)
+            for build in requirements["build"]
         )
-        return any(re_compiler.match(build) for build in requirements["build"])
 
     if not is_compiler_present():
         return
@@ -614,6 +812,32 @@ def get_test_imports(metadata: dict, default: str | None = None) -> list:
     return result
 
 
+def _fast_parse_entry_points(text: str) -> dict | None:
+    """Parse the usual ``[section]`` followed by ``name = module:func`` lines
+    of an entry points string without going through the TOML parser.
+    Returns None when the text does not follow that simple grammar.
+    """
+    result = {}
+    section = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if match := RE_ENTRY_POINT_SECTION.fullmatch(line):
+            if match[1] in result:
+                return None
+            section = result[match[1]] = {}
+        elif section is not None and (match := RE_ENTRY_POINT_LINE.fullmatch(line)):
+            if match[1] in section:
+                return None
+            section[match[1]] = next(
+                val for val in match.groups()[1:] if val is not None
+            )
+        else:
+            return None
+    return result
+
+
 def get_entry_points_from_sdist(sdist_metadata: dict) -> list:
     """Extract entry points from sdist metadata
 
@@ -623,7 +847,12 @@ def get_entry_points_from_sdist(sdist_metadata: dict) -> list:
     all_entry_points = sdist_metadata.get("entry_points", {})
     if not all_entry_points:
         return []
-    if isinstance(all_entry_points, str):
+    if (
+        isinstance(all_entry_points, str)
+        and (parsed := _fast_parse_entry_points(all_entry_points)) is not None
+    ):
+        all_entry_points = parsed
+    elif isinstance(all_entry_points, str):
         all_lines = []
         for line in all_entry_points.splitlines():
             if "=" not in line:
@@ -635,7 +864,7 @@ def get_entry_points_from_sdist(sdist_metadata: dict) -> list:
             all_lines.append("=".join(all_parts))
         try:
             all_entry_points = tomllib.loads("\n".join(all_lines))
-        except tomllib.TOMLDecoderError:
+        except tomllib.TOMLDecodeError:
             return []
 
     if all_entry_points.get("console_scripts") or all_entry_points.get("gui_scripts"):
@@ -669,54 +898,57 @@ def get_entry_points_from_sdist(sdist_metadata: dict) -> list:
     return []
 
 
-def download_sdist_pkg(sdist_url: str, dest: str, name: str | None = None):
+def download_sdist_pkg(
+    sdist_url: str, dest: str, name: str | None = None, hasher=None
+) -> str | None:
     """Download the sdist package
 
     :param sdist_url: sdist url
     :param dest: Folder were the method will download the sdist
+    :param hasher: optional hashlib object updated with the downloaded chunks
+    :return: hex digest of the hasher if one was given
     """
     print_msg(
         f"{Fore.GREEN}Starting the download of the sdist package"
         f" {Fore.BLUE}{Style.BRIGHT}{name}"
     )
     log.debug(f"Downloading {name} sdist - {sdist_url}")
-    response = requests.get(sdist_url, allow_redirects=True, stream=True, timeout=5)
-    response.raise_for_status()
-    total_size = int(response.headers.get("Content-length", 0))
-    with manage_progressbar(max_value=total_size, prefix=f"{name} ") as bar:
-        with open(dest, "wb") as pkg_file:
-            progress_val = 0
-            chunk_size = 512
-            for chunk_data in response.iter_content(chunk_size=chunk_size):
-                if chunk_data:
-                    pkg_file.write(chunk_data)
-                    progress_val += chunk_size
-                    bar.update(min(progress_val, total_size))
+    with PYPI_SESSION.get(
+        sdist_url, allow_redirects=True, stream=True, timeout=5
+    ) as response:
+        response.raise_for_status()
+        total_size = int(response.headers.get("Content-length", 0))
+        with manage_progressbar(max_value=total_size, prefix=f"{name} ") as bar:
+            with open(dest, "wb") as pkg_file:
+                progress_val = 0
+                for chunk_data in response.iter_content(chunk_size=1 << 16):
+                    if chunk_data:
+                        pkg_file.write(chunk_data)
+                        if hasher is not None:
+                            hasher.update(chunk_data)
+                        progress_val += len(chunk_data)
+                        bar.update(min(progress_val, total_size))
+    return hasher.hexdigest() if hasher is not None else None
 
 
 def merge_deps_toml_setup(setup_deps: list, toml_deps: list) -> list:
-    re_split = re.compile(r"\s+|>|=|<|~|!")
     # drop any empty deps
     setup_deps = [dep for dep in setup_deps if dep.strip()]
     toml_deps = [dep for dep in toml_deps if dep.strip()]
 
-    # get dep names
-    toml_dep_names = [re_split.split(dep)[0] for dep in toml_deps]
-    setup_dep_names = [re_split.split(dep)[0] for dep in setup_deps]
+    # get normalized dep names, "foo_bar" and "Foo-Bar" are the same package
+    toml_dep_names = {
+        canonicalize_name(RE_DEP_NAME_SPLIT.split(dep, maxsplit=1)[0])
+        for dep in toml_deps
+    }
 
     # prefer toml over setup; only add setup deps if not found in toml
     merged_deps = toml_deps
-    for dep_name, dep in zip(setup_dep_names, setup_deps):
+    for dep in setup_deps:
+        dep_name = RE_DEP_NAME_SPLIT.split(dep, maxsplit=1)[0]
         if not dep_name.strip():
             continue
-        alternatives = [
-            dep_name,
-            dep_name.replace("_", "-"),
-            dep_name.replace("-", "_"),
-        ]
-        found = any([alternative in toml_dep_names for alternative in alternatives])
-        # only add the setup dep if no alternative name was found
-        if not found:
+        if canonicalize_name(dep_name) not in toml_dep_names:
             merged_deps.append(dep)
 
     return merged_deps
@@ -767,6 +999,40 @@ def merge_setup_toml_metadata(setup_metadata: dict, pyproject_metadata: dict) ->
     return setup_metadata
 
 
+def unpack_sdist(
+    path_pkg: str | Path, dest: str, with_sha256: bool = False
+) -> str | None:
+    """Unpack the whole sdist, setup.py and the license discovery can use any
+    file from it. Tarballs are read as a stream, the random access mode would
+    decompress them twice, once to list the members and again to extract. It
+    is only used when the stream cannot be extracted.
+
+    :param path_pkg: path to the sdist
+    :param dest: folder where the sdist will be unpacked
+    :param with_sha256: compute the sha256 of the sdist while reading it
+    :return: sha256 of the sdist if ``with_sha256`` is set
+    """
+    if not tarfile.is_tarfile(path_pkg):
+        shutil.unpack_archive(path_pkg, dest)
+        return sha256_checksum(path_pkg) if with_sha256 else None
+    with open(path_pkg, "rb") as pkg_file:
+        reader = HashingReader(pkg_file)
+        try:
+            with tarfile.open(fileobj=reader, mode="r|*") as tar:
+                tar.extractall(dest)
+        except tarfile.StreamError:
+            # A hardlink which cannot be created is copied from its target
+            # instead, that needs to seek back in the archive
+            log.debug(f"Cannot stream {path_pkg}, extracting it again")
+            with tarfile.open(path_pkg) as tar:
+                tar.extractall(dest)
+            return sha256_checksum(path_pkg) if with_sha256 else None
+        if not with_sha256:
+            return None
+        reader.drain()
+    return reader.hash.hexdigest()
+
+
 def get_sdist_metadata(
     sdist_url: str, config: Configuration, with_source: bool = False
 ) -> dict:
@@ -778,46 +1044,76 @@ def get_sdist_metadata(
     :return: sdist metadata
     """
     temp_folder = mkdtemp(prefix=f"grayskull-{config.name}-")
+    sdist_sha256 = None
     if config.from_local_sdist:
         path_pkg = Path(config.local_sdist).resolve()
     else:
         pkg_name = pkg_name_from_sdist_url(sdist_url)
         path_pkg = os.path.join(temp_folder, pkg_name)
 
-        download_sdist_pkg(sdist_url=sdist_url, dest=path_pkg, name=config.name)
+        # hash while downloading instead of reading the file again afterwards
+        sdist_sha256 = download_sdist_pkg(
+            sdist_url=sdist_url,
+            dest=path_pkg,
+            name=config.name,
+            hasher=hashlib.sha256() if with_source else None,
+        )
         if config.download:
             config.files_to_copy.append(path_pkg)
     log.debug(f"Unpacking {path_pkg} to {temp_folder}")
-    shutil.unpack_archive(path_pkg, temp_folder)
+    need_sha256 = (with_source and sdist_sha256 is None) or config.from_local_sdist
+    sdist_sha256 = unpack_sdist(path_pkg, temp_folder, need_sha256) or sdist_sha256
 
+    sdist_files = find_sdist_files(
+        temp_folder, ("pyproject.toml", "PKG-INFO", "setup.py", "setup.cfg")
+    )
     print_msg("Checking for pyproject.toml")
-    pyproject_toml = glob(f"{temp_folder}/**/pyproject.toml", recursive=True)
     pyproject_metadata = {}
-    if pyproject_toml:
-        pyproject_toml = Path(pyproject_toml[0])
+    if pyproject_toml := sdist_files.get("pyproject.toml"):
         print_msg(f"pyproject.toml found in {pyproject_toml}")
         pyproject_metadata = get_all_toml_info(pyproject_toml)
     else:
         print_msg("pyproject.toml not found.")
 
-    print_msg("Recovering information from setup.py")
-    with injection_distutils(temp_folder) as metadata:
-        metadata["sdist_path"] = temp_folder
+    path_pkg_info = sdist_files.get("PKG-INFO")
+    dist = UnpackedSDist(path_pkg_info.parent) if path_pkg_info else None
+    # same precedence as search_setup_root
+    path_setup = (
+        sdist_files.get("setup.py")
+        or sdist_files.get("setup.cfg")
+        or sdist_files.get("pyproject.toml")
+    )
+    if (
+        dist is not None
+        and has_static_requirements(dist)
+        and is_setup_py_declarative(path_setup)
+    ):
+        # Nothing would be recovered by running setup.py, avoid installing
+        # its dependencies and executing it
+        print_msg("Static metadata found in PKG-INFO, skipping setup.py")
+        setup_dir = path_setup.parent if path_setup else temp_folder
+        metadata = merge_sdist_metadata({}, get_setup_cfg(setup_dir))
+        for key, value in get_requirements_from_pkg_info(dist).items():
+            if not metadata.get(key):
+                metadata[key] = value
+    else:
+        print_msg("Recovering information from setup.py")
+        with injection_distutils(temp_folder) as metadata:
+            pass
+    metadata["sdist_path"] = temp_folder
 
     # At this point the tarball was successfully extracted
     # so we can assume the sha256 can be computed reliably
     if with_source:
-        metadata["source"] = {"url": sdist_url, "sha256": sha256_checksum(path_pkg)}
+        metadata["source"] = {"url": sdist_url, "sha256": sdist_sha256}
     if config.from_local_sdist:
-        metadata["source"] = {
-            "url": Path(path_pkg).as_uri(),
-            "sha256": sha256_checksum(path_pkg),
-        }
-
-    # Get some keys from PKG-INFO
-    path_pkg_info = list(Path(temp_folder).rglob("PKG-INFO"))
-    if path_pkg_info:
-        dist = UnpackedSDist(path_pkg_info[0].parent)
+        metadata["source"] = {"url": Path(path_pkg).as_uri(), "sha256": sdist_sha256}
+
+    # Get some keys from PKG-INFO, running setup.py might have generated it
+    if dist is None:
+        path_pkg_info = find_sdist_files(temp_folder, ("PKG-INFO",)).get("PKG-INFO")
+        dist = UnpackedSDist(path_pkg_info.parent) if path_pkg_info else None
+    if dist is not None:
         for key in ("name", "version", "summary", "author"):
             metadata[key] = getattr(dist, key, None)
 
@@ -827,9 +1123,9 @@ def get_sdist_metadata(
     # in pyproject.toml
     # For setuptools, it is possible to get it from top_level.txt
     if "packages" not in metadata or not metadata["packages"]:
-        top_level = list(Path(temp_folder).rglob("*.egg-info/top_level.txt"))
+        top_level = find_egg_info_top_level(temp_folder)
         if top_level:
-            metadata["packages"] = top_level[0].read_text().split()
+            metadata["packages"] = top_level.read_text().split()
 
     return merge_setup_toml_metadata(metadata, pyproject_metadata)
 
@@ -842,32 +1138,31 @@ def split_deps(deps: str) -> list[str]:
     result = []
     for d in deps.split(","):
         constrain = ""
-        for val in re.split(r"([><!=~^]+)", d):
+        for val in RE_DEP_OPERATOR.split(d):
             if not val:
                 continue
-            if {">", "<", "=", "!", "~", "^"} & set(val):
+            if not DEP_OPERATOR_CHARS.isdisjoint(val):
                 constrain = val.strip()
             else:
                 result.append(f"{constrain}{val.strip()}")
     return result
 
 
+@lru_cache(maxsize=4096)
 def ensure_pep440(pkg: str | None) -> str | None:
     if not pkg or RE_PEP725_PURL.match(pkg):
         return pkg
     pkg = pkg.strip()
-    if any([pkg.startswith(pattern) for pattern in ("<{", "{{")]):
-        return pkg
-    split_pkg = pkg.strip().split(" ")
-    if len(split_pkg) <= 1:
+    if pkg.startswith(("<{", "{{")) or " " not in pkg:
         return pkg
+    name, constrain_pkg = pkg.split(" ", 1)
     selector = ""
-    if "#" in split_pkg:
-        hash_index = split_pkg.index("#")
-        selector = f"  {' '.join(split_pkg[hash_index:])}"
-        split_pkg = split_pkg[:hash_index]
-    constrain_pkg = "".join(split_pkg[1:])
-    list_constrains = split_deps(constrain_pkg)
+    # the selector starts at the first standalone "#"
+    hash_index = f" {constrain_pkg} ".find(" # ")
+    if hash_index != -1:
+        selector = f"  {constrain_pkg[hash_index:]}"
+        constrain_pkg = constrain_pkg[:hash_index]
+    list_constrains = split_deps(constrain_pkg.replace(" ", ""))
     full_constrain = []
     for constrain in list_constrains:
         if "~=" in constrain:
@@ -877,9 +1172,10 @@ def ensure_pep440(pkg: str | None) -> str | None:
         else:
             full_constrain.append(constrain.strip())
     all_constrains = ",".join(full_constrain)
-    return f"{split_pkg[0]} {all_constrains}{selector}"
+    return f"{name} {all_constrains}{selector}"
 
 
+@lru_cache(maxsize=4096)
 def next_incompatible_version(version: str) -> str:
     """Return the next incompatible version for the given version."""
     comments_removed = version.split("#")[0]
@@ -1,7 +1,5 @@
 import sys
-from collections import defaultdict
 from collections.abc import Iterator
-from functools import singledispatch
 from pathlib import Path
 
 from grayskull.strategy.parse_poetry_version import (
@@ -18,19 +16,68 @@ else:
     import tomli as tomllib
 
 
-class InvalidPoetryDependency(BaseException):
+# PURL to the name in the conda ecosystem
+PEP725_PACKAGE_MAPPING = {
+    "virtual:compiler/c": "{{ compiler('c') }}",
+    "virtual:compiler/cpp": "{{ compiler('cxx') }}",
+    "virtual:compiler/fortran": "{{ compiler('fortran') }}",
+    "virtual:compiler/rust": "{{ compiler('rust') }}",
+    "virtual:interface/blas": "{{ blas }}",
+    "pkg:generic/boost": "boost-cpp",
+    "pkg:generic/brial": "brial",
+    "pkg:generic/cddlib": "cddlib",
+    "pkg:generic/cliquer": "cliquer",
+    "pkg:generic/ecl": "ecl",
+    "pkg:generic/eclib": "eclib",
+    "pkg:generic/ecm": "ecm",
+    "pkg:generic/fflas-ffpack": "fflas-ffpack",
+    "pkg:generic/fplll": "fplll",
+    "pkg:generic/flint": "libflint",
+    "pkg:generic/libgd": "libgd",
+    "pkg:generic/gap": "gap-defaults",
+    "pkg:generic/gfan": "gfan",
+    "pkg:generic/gmp": "gmp",
+    "pkg:generic/giac": "giac",
+    "pkg:generic/givaro": "givaro",
+    "pkg:generic/pkg-config": "pkg-config",
+    "pkg:generic/glpk": "glpk",
+    "pkg:generic/gsl": "gsl",
+    "pkg:generic/iml": "iml",
+    "pkg:generic/lcalc": "lcalc",
+    "pkg:generic/libbraiding": "libbraiding",
+    "pkg:generic/libhomfly": "libhomfly",
+    "pkg:generic/lrcalc": "lrcalc",
+    "pkg:generic/libpng": "libpng",
+    "pkg:generic/linbox": "linbox",
+    "pkg:generic/m4ri": "m4ri",
+    "pkg:generic/m4rie": "m4rie",
+    "pkg:generic/mpc": "mpc",
+    "pkg:generic/mpfi": "mpfi",
+    "pkg:generic/mpfr": "mpfr",
+    "pkg:generic/maxima": "maxima",
+    "pkg:generic/nauty": "nauty",
+    "pkg:generic/ntl": "ntl",
+    "pkg:generic/pari": "pari",
+    "pkg:generic/pari-elldata": "pari-elldata",
+    "pkg:generic/pari-galdata": "pari-galdata",
+    "pkg:generic/pari-seadata": "pari-seadata",
+    "pkg:generic/palp": "palp",
+    "pkg:generic/planarity": "planarity",
+    "pkg:generic/ppl": "ppl",
+    "pkg:generic/primesieve": "primesieve",
+    "pkg:generic/primecount": "primecount",
+    "pkg:generic/qhull": "qhull",
+    "pkg:generic/rw": "rw",
+    "pkg:generic/singular": "singular",
+    "pkg:generic/symmetrica": "symmetrica",
+    "pkg:generic/sympow": "sympow",
+}
+
+
+class InvalidPoetryDependency(Exception):
     pass
 
 
-@singledispatch
-def get_constrained_dep(dep_spec: list | str | dict, dep_name: str) -> str:
-    raise InvalidPoetryDependency(
-        "Expected Poetry dependency specification to be of type list, str or dict, "
-        f"received {type(dep_spec).__name__}"
-    )
-
-
-@get_constrained_dep.register
 def __get_constrained_dep_dict(
     dep_spec: dict, dep_name: str
 ) -> Iterator[str, None, None]:
@@ -59,7 +106,6 @@ def __get_constrained_dep_dict(
     yield f"{dep_name}{conda_version}{conda_selector}".strip()
 
 
-@get_constrained_dep.register
 def __get_constrained_dep_str(
     dep_spec: str, dep_name: str
 ) -> Iterator[str, None, None]:
@@ -67,7 +113,6 @@ def __get_constrained_dep_str(
     yield f"{dep_name} {conda_version}"
 
 
-@get_constrained_dep.register
 def __get_constrained_dep_list(
     dep_spec_list: list, dep_name: str
 ) -> Iterator[str, None, None]:
@@ -75,16 +120,32 @@ def __get_constrained_dep_list(
         yield from get_constrained_dep(dep_spec, dep_name)
 
 
+def get_constrained_dep(
+    dep_spec: list | str | dict, dep_name: str
+) -> Iterator[str, None, None]:
+    # Plain isinstance dispatch, it is called once per Poetry dependency
+    # and avoids the singledispatch registry lookup on each call
+    if isinstance(dep_spec, str):
+        return __get_constrained_dep_str(dep_spec, dep_name)
+    if isinstance(dep_spec, dict):
+        return __get_constrained_dep_dict(dep_spec, dep_name)
+    if isinstance(dep_spec, list):
+        return __get_constrained_dep_list(dep_spec, dep_name)
+    raise InvalidPoetryDependency(
+        "Expected Poetry dependency specification to be of type list, str or dict, "
+        f"received {type(dep_spec).__name__}"
+    )
+
+
 def encode_poetry_deps(poetry_deps: dict) -> tuple[list, list]:
     run = []
     run_constrained = []
     for dep_name, dep_spec in poetry_deps.items():
-        for constrained_dep in get_constrained_dep(dep_spec, dep_name):
-            try:
-                assert dep_spec.get("optional", False)
-                run_constrained.append(constrained_dep)
-            except (AttributeError, AssertionError):
-                run.append(constrained_dep)
+        if isinstance(dep_spec, dict) and dep_spec.get("optional", False):
+            target = run_constrained
+        else:
+            target = run
+        target.extend(get_constrained_dep(dep_spec, dep_name))
     return run, run_constrained
 
 
@@ -96,24 +157,21 @@ def add_poetry_metadata(metadata: dict, toml_metadata: dict) -> dict:
     poetry_deps = poetry_metadata.get("dependencies", {})
     req_run, req_run_constrained = encode_poetry_deps(poetry_deps)
 
+    requirements = metadata["requirements"]
     # add dependencies
-    metadata["requirements"].setdefault("run", [])
-    metadata["requirements"]["run"].extend(req_run)
+    requirements.setdefault("run", []).extend(req_run)
 
     # add optional dependencies
-    if len(req_run_constrained):
-        metadata["requirements"].setdefault("run_constrained", [])
-        metadata["requirements"]["run_constrained"].extend(req_run_constrained)
-
-    host_metadata = metadata["requirements"].get("host", [])
-    if toml_metadata["tool"].get("poetry", {}).get("scripts"):
-        metadata["build"]["entry_points"] = []
-        for entry_name, entry_path in toml_metadata["tool"]["poetry"][
-            "scripts"
-        ].items():
-            metadata["build"]["entry_points"].append(f"{entry_name} = {entry_path}")
+    if req_run_constrained:
+        requirements.setdefault("run_constrained", []).extend(req_run_constrained)
+
+    host_metadata = requirements.get("host", [])
+    if scripts := poetry_metadata.get("scripts"):
+        metadata["build"]["entry_points"] = [
+            f"{entry_name} = {entry_path}" for entry_name, entry_path in scripts.items()
+        ]
     if "poetry" not in host_metadata and "poetry-core" not in host_metadata:
-        metadata["requirements"]["host"] = host_metadata + ["poetry-core"]
+        requirements["host"] = host_metadata + ["poetry-core"]
 
     poetry_test_deps = (
         poetry_metadata.get("group", {}).get("test", {}).get("dependencies", {})
@@ -155,63 +213,7 @@ def is_pep725_present(toml_metadata: dict):
 def get_pep725_mapping(purl: str):
     """This function maps a PURL to the name in the conda ecosystem. It is expected
     that this will be provided on a per-ecosystem basis (such as by conda-forge)"""
-
-    package_mapping = {
-        "virtual:compiler/c": "{{ compiler('c') }}",
-        "virtual:compiler/cpp": "{{ compiler('cxx') }}",
-        "virtual:compiler/fortran": "{{ compiler('fortran') }}",
-        "virtual:compiler/rust": "{{ compiler('rust') }}",
-        "virtual:interface/blas": "{{ blas }}",
-        "pkg:generic/boost": "boost-cpp",
-        "pkg:generic/brial": "brial",
-        "pkg:generic/cddlib": "cddlib",
-        "pkg:generic/cliquer": "cliquer",
-        "pkg:generic/ecl": "ecl",
-        "pkg:generic/eclib": "eclib",
-        "pkg:generic/ecm": "ecm",
-        "pkg:generic/fflas-ffpack": "fflas-ffpack",
-        "pkg:generic/fplll": "fplll",
-        "pkg:generic/flint": "libflint",
-        "pkg:generic/libgd": "libgd",
-        "pkg:generic/gap": "gap-defaults",
-        "pkg:generic/gfan": "gfan",
-        "pkg:generic/gmp": "gmp",
-        "pkg:generic/giac": "giac",
-        "pkg:generic/givaro": "givaro",
-        "pkg:generic/pkg-config": "pkg-config",
-        "pkg:generic/glpk": "glpk",
-        "pkg:generic/gsl": "gsl",
-        "pkg:generic/iml": "iml",
-        "pkg:generic/lcalc": "lcalc",
-        "pkg:generic/libbraiding": "libbraiding",
-        "pkg:generic/libhomfly": "libhomfly",
-        "pkg:generic/lrcalc": "lrcalc",
-        "pkg:generic/libpng": "libpng",
-        "pkg:generic/linbox": "linbox",
-        "pkg:generic/m4ri": "m4ri",
-        "pkg:generic/m4rie": "m4rie",
-        "pkg:generic/mpc": "mpc",
-        "pkg:generic/mpfi": "mpfi",
-        "pkg:generic/mpfr": "mpfr",
-        "pkg:generic/maxima": "maxima",
-        "pkg:generic/nauty": "nauty",
-        "pkg:generic/ntl": "ntl",
-        "pkg:generic/pari": "pari",
-        "pkg:generic/pari-elldata": "pari-elldata",
-        "pkg:generic/pari-galdata": "pari-galdata",
-        "pkg:generic/pari-seadata": "pari-seadata",
-        "pkg:generic/palp": "palp",
-        "pkg:generic/planarity": "planarity",
-        "pkg:generic/ppl": "ppl",
-        "pkg:generic/primesieve": "primesieve",
-        "pkg:generic/primecount": "primecount",
-        "pkg:generic/qhull": "qhull",
-        "pkg:generic/rw": "rw",
-        "pkg:generic/singular": "singular",
-        "pkg:generic/symmetrica": "symmetrica",
-        "pkg:generic/sympow": "sympow",
-    }
-    return package_mapping.get(purl, purl)
+    return PEP725_PACKAGE_MAPPING.get(purl, purl)
 
 
 def add_pep725_metadata(metadata: dict, toml_metadata: dict):
@@ -228,18 +230,14 @@ def add_pep725_metadata(metadata: dict, toml_metadata: dict):
         ("run", "dependencies"),
     )
     for conda_section, pep725_section in section_map:
-        requirements.setdefault(conda_section, [])
-        requirements[conda_section].extend(
-            [get_pep725_mapping(purl) for purl in externals.get(pep725_section, [])]
-        )
+        target = requirements.setdefault(conda_section, [])
+        target.extend(map(get_pep725_mapping, externals.get(pep725_section, ())))
         # TODO: handle optional dependencies properly
         optional_features = toml_metadata.get(f"optional-{pep725_section}", {})
         for feature_name, feature_deps in optional_features.items():
-            requirements[conda_section].append(
-                f'# OPTIONAL dependencies from feature "{feature_name}"'
-            )
-            requirements[conda_section].extend(feature_deps)
-        if not requirements[conda_section]:
+            target.append(f'# OPTIONAL dependencies from feature "{feature_name}"')
+            target.extend(feature_deps)
+        if not target:
             del requirements[conda_section]
 
     if requirements:
@@ -250,10 +248,10 @@ def add_pep725_metadata(metadata: dict, toml_metadata: dict):
 def get_all_toml_info(path_toml: Path | str) -> dict:
     with open(path_toml, "rb") as f:
         toml_metadata = tomllib.load(f)
-    toml_metadata = defaultdict(dict, toml_metadata)
     metadata = nested_dict()
     toml_project = toml_metadata.get("project", {}) or {}
-    metadata["requirements"]["host"] = toml_metadata["build-system"].get("requires", [])
+    build_system = toml_metadata.get("build-system", {}) or {}
+    metadata["requirements"]["host"] = build_system.get("requires", [])
     metadata["requirements"]["run"] = toml_project.get("dependencies", [])
     license = toml_project.get("license")
     if isinstance(license, dict):
@@ -266,29 +264,29 @@ def get_all_toml_info(path_toml: Path | str) -> dict:
         or optional_deps.get("tests", [])
     )
 
-    tom_urls = toml_project.get("urls", {})
-    if homepage := tom_urls.get("Homepage"):
-        metadata["about"]["home"] = homepage
-    if dev_url := tom_urls.get("Source"):
-        metadata["about"]["dev_url"] = dev_url
-
     if toml_project.get("requires-python"):
         py_constrain = f"python {toml_project['requires-python']}"
         metadata["requirements"]["host"].append(py_constrain)
         metadata["requirements"]["run"].append(py_constrain)
 
-    if toml_project.get("scripts"):
-        metadata["build"]["entry_points"] = []
-        for entry_name, entry_path in toml_project.get("scripts", {}).items():
-            metadata["build"]["entry_points"].append(f"{entry_name} = {entry_path}")
+    if scripts := toml_project.get("scripts"):
+        metadata["build"]["entry_points"] = [
+            f"{entry_name} = {entry_path}" for entry_name, entry_path in scripts.items()
+        ]
     if all_urls := toml_project.get("urls"):
         metadata["about"]["dev_url"] = all_urls.get("Source", None)
         metadata["about"]["home"] = all_urls.get("Homepage", None)
     metadata["about"]["summary"] = toml_project.get("description")
     metadata["name"] = metadata.get("name") or toml_project.get("name")
 
-    add_poetry_metadata(metadata, toml_metadata)
-    add_flit_metadata(metadata, toml_metadata)
-    add_pep725_metadata(metadata, toml_metadata)
+    # Most pyproject.toml files do not use any of these backends, check the
+    # sections here instead of going through each helper
+    tool = toml_metadata.get("tool") or {}
+    if "poetry" in tool:
+        add_poetry_metadata(metadata, toml_metadata)
+    if "flit" in tool:
+        add_flit_metadata(metadata, toml_metadata)
+    if "external" in toml_metadata:
+        add_pep725_metadata(metadata, toml_metadata)
 
     return metadata
@@ -22,6 +22,7 @@ from grayskull.cli.stdout import print_msg, print_requirements, progressbar_with
 from grayskull.config import Configuration
 from grayskull.strategy.abstract_strategy import AbstractStrategy
 from grayskull.strategy.py_base import (
+    PYPI_SESSION,
     RE_DEPS_NAME,
     clean_deps_for_conda_forge,
     discover_license,
@@ -295,7 +296,7 @@ def get_pypi_metadata(config: Configuration) -> PypiMetadata:
         log.info(f"Version for {config.name} not specified.\nGetting the latest one.")
         url_pypi_metadata = config.url_pypi_metadata.format(pkg_name=config.name)
 
-    metadata = requests.get(url=url_pypi_metadata, timeout=5)
+    metadata = PYPI_SESSION.get(url=url_pypi_metadata, timeout=5)
     if metadata.status_code != 200:
         raise requests.HTTPError(
             f"It was not possible to recover package metadata for {config.name}.\n"
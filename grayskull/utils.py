@@ -71,14 +71,23 @@ def get_vendored_dependencies(script_file: str) -> list:
     :param script_file: Path to the setup.py
     :return: List with all vendored dependencies
     """
+    script_file = os.path.abspath(script_file)
+    return list(
+        _get_vendored_dependencies(script_file, os.stat(script_file).st_mtime_ns)
+    )
+
+
+@lru_cache(maxsize=64)
+def _get_vendored_dependencies(script_file: str, mtime_ns: int) -> tuple:
+    # mtime_ns is only part of the cache key, to refresh if the file changes
     all_std_modules = get_std_modules()
     all_modules_used = get_all_modules_imported_script(script_file)
     local_modules = get_local_modules(os.path.dirname(script_file))
-    return [
+    return tuple(
         dep.lower()
         for dep in all_modules_used
         if dep not in local_modules and dep not in all_std_modules
-    ]
+    )
 
 
 @lru_cache(maxsize=20)
@@ -108,6 +117,19 @@ def origin_is_local_sdist(name: str) -> bool:
     )
 
 
+def get_cache_dir(*sub_folders: str) -> Path:
+    """Return grayskull's cache folder, creating it if necessary.
+
+    The folder is placed under ``$XDG_CACHE_HOME`` (``~/.cache`` by default).
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    cache_dir = Path(cache_home, "grayskull", *sub_folders)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+
 def sha256_checksum(filename, block_size=65536):
     sha256 = hashlib.sha256()
     with open(filename, "rb") as f:
@@ -116,6 +138,36 @@ def sha256_checksum(filename, block_size=65536):
     return sha256.hexdigest()
 
 
+class HashingReader:
+    """Read-only file object which computes the sha256 of the bytes read through
+    it and, optionally, copies them to ``copy_to``."""
+
+    def __init__(self, fileobj, copy_to=None):
+        self._fileobj = fileobj
+        self._copy_to = copy_to
+        self.hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._fileobj.read(size)
+        self.hash.update(data)
+        if self._copy_to is not None:
+            self._copy_to.write(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def seekable(self):
+        return False
+
+    def drain(self, block_size=1 << 20):
+        """Consume the rest of the stream to complete the hash (and the copy)."""
+        while self.read(block_size):
+            pass
+
+
 def string_similarity(a, b):
     return SequenceMatcher(None, a, b).ratio()
 
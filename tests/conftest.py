@@ -7,6 +7,11 @@ from pytest import fixture
 from grayskull.strategy.py_base import download_sdist_pkg
 
 
+@fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+
+
 @fixture(scope="session")
 def data_dir() -> str:
     return os.path.join(os.path.dirname(__file__), "data")
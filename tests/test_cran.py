@@ -1,34 +1,51 @@
+import hashlib
+import io
+import os
+import tarfile
 from unittest.mock import MagicMock, patch
 
 import pytest
+import requests
 
 from grayskull.config import Configuration
 from grayskull.strategy.cran import (
+    get_cran_archive_index,
+    get_cran_contrib_index,
+    get_cran_index,
     get_cran_metadata,
+    get_cran_pkg_metadata,
+    get_webpage,
+    prune_cran_cache,
+    read_cran_tarball,
     scrap_cran_archive_page_for_package_folder_url,
     scrap_cran_pkg_folder_page_for_full_url,
     scrap_main_page_cran_find_latest_package,
 )
+from grayskull.utils import get_cache_dir, sha256_checksum
+
+
+@pytest.fixture(autouse=True)
+def clear_cran_caches():
+    cached_functions = (get_cran_archive_index, get_cran_contrib_index, get_webpage)
+    for cached_function in cached_functions:
+        cached_function.cache_clear()
+    yield
+    for cached_function in cached_functions:
+        cached_function.cache_clear()
 
 
 @pytest.fixture
-def webpage_magic_mock():
-    mock_webpage = MagicMock()
-    mock_url = MagicMock()
-    mock_url.get_text.return_value = "PKG_NAME_1.0.0.tar.gz"
-    mock_url.get.return_value = "PKG_NAME_URL"
-    mock_url_foo = MagicMock()
-    mock_url_foo.get_text.return_value = "OTHER_PACKAGE_2.0.1.tar.gz"
-    mock_url_bar = MagicMock()
-    mock_url_bar.get_text.return_value = "PKG_NAME/"
-    mock_url_bar.get.return_value = "PKG_NAME_URL_BAR/"
-    mock_webpage.findAll.return_value = [mock_url_foo, mock_url_bar, mock_url]
-    return mock_webpage
+def webpage_anchors():
+    return [
+        ("OTHER_PACKAGE_URL", "OTHER_PACKAGE_2.0.1.tar.gz"),
+        ("PKG_NAME_URL_BAR/", "PKG_NAME/"),
+        ("PKG_NAME_URL", "PKG_NAME_1.0.0.tar.gz"),
+    ]
 
 
 @patch("grayskull.strategy.cran.get_webpage")
-def test_scrap_main_page_cran_find_latest_package(mock_get_webpage, webpage_magic_mock):
-    mock_get_webpage.return_value = webpage_magic_mock
+def test_scrap_main_page_cran_find_latest_package(mock_get_webpage, webpage_anchors):
+    mock_get_webpage.return_value = webpage_anchors
     assert scrap_main_page_cran_find_latest_package(
         "CRAN_URL", "PKG_NAME", "1.0.0"
     ) == ("pkg_name", "1.0.0", "CRAN_URL/src/contrib/PKG_NAME_URL")
@@ -41,54 +58,181 @@ def test_scrap_main_page_cran_find_latest_package(mock_get_webpage, webpage_magi
 
 @patch("grayskull.strategy.cran.get_webpage")
 def test_scrap_main_page_cran_find_latest_package_not_latest(
-    mock_get_webpage, webpage_magic_mock
+    mock_get_webpage, webpage_anchors
 ):
-    mock_get_webpage.return_value = webpage_magic_mock
+    mock_get_webpage.return_value = webpage_anchors
     assert scrap_main_page_cran_find_latest_package(
         "CRAN_URL", "PKG_NAME", "0.1.0"
     ) == ("pkg_name", "0.1.0", "CRAN_URL/src/contrib/Archive")
 
 
+@patch("grayskull.strategy.cran.get_webpage")
+def test_scrap_main_page_cran_find_latest_package_stale_index(
+    mock_get_webpage, webpage_anchors
+):
+    mock_get_webpage.side_effect = [
+        webpage_anchors,
+        [("PKG_NAME_NEW_URL", "PKG_NAME_1.1.0.tar.gz")],
+    ]
+    assert scrap_main_page_cran_find_latest_package(
+        "CRAN_URL", "PKG_NAME", "1.1.0"
+    ) == ("pkg_name", "1.1.0", "CRAN_URL/src/contrib/PKG_NAME_NEW_URL")
+    assert mock_get_webpage.call_count == 2
+
+
+@patch("grayskull.strategy.cran.get_webpage")
+def test_get_cran_contrib_index(mock_get_webpage, webpage_anchors):
+    mock_get_webpage.return_value = webpage_anchors
+    assert get_cran_contrib_index("CRAN_URL") == {
+        "other_package": ("OTHER_PACKAGE", "2.0.1", "OTHER_PACKAGE_URL"),
+        "pkg_name": ("PKG_NAME", "1.0.0", "PKG_NAME_URL"),
+    }
+    get_cran_contrib_index("CRAN_URL")
+    mock_get_webpage.assert_called_once_with(
+        "CRAN_URL/src/contrib/", modified_since=None
+    )
+
+
+@patch("grayskull.strategy.cran.get_webpage")
+def test_get_cran_contrib_index_disk_cache(mock_get_webpage, webpage_anchors):
+    mock_get_webpage.return_value = webpage_anchors
+    index = get_cran_contrib_index("CRAN_URL")
+    get_cran_contrib_index.cache_clear()
+    assert get_cran_contrib_index("CRAN_URL") == index
+    mock_get_webpage.assert_called_once()
+
+
+@patch("grayskull.strategy.cran.get_webpage")
+def test_get_cran_contrib_index_not_modified(mock_get_webpage, webpage_anchors):
+    mock_get_webpage.return_value = webpage_anchors
+    index = get_cran_contrib_index("CRAN_URL")
+    get_cran_contrib_index.cache_clear()
+    mock_get_webpage.return_value = None
+    with patch("grayskull.strategy.cran.CRAN_INDEX_TTL", 0):
+        assert get_cran_contrib_index("CRAN_URL") == index
+    assert mock_get_webpage.call_args.kwargs["modified_since"] is not None
+
+
+@pytest.mark.parametrize("cached", ['{"pkg_name": ["PKG_NAME", "1.0', "[]"])
+@patch("grayskull.strategy.cran.get_webpage")
+def test_get_cran_contrib_index_corrupted_cache(
+    mock_get_webpage, webpage_anchors, cached
+):
+    url_hash = hashlib.sha256(b"CRAN_URL").hexdigest()[:16]
+    (get_cache_dir("cran") / f"index-{url_hash}.json").write_text(cached)
+    mock_get_webpage.return_value = webpage_anchors
+    assert get_cran_contrib_index("CRAN_URL")["pkg_name"] == (
+        "PKG_NAME",
+        "1.0.0",
+        "PKG_NAME_URL",
+    )
+    mock_get_webpage.assert_called_once_with(
+        "CRAN_URL/src/contrib/", modified_since=None
+    )
+
+
+@patch("grayskull.strategy.cran.CRAN_SESSION.get")
+def test_get_webpage_cached(mock_get):
+    mock_get.return_value.status_code = 200
+    mock_get.return_value.content = (
+        b'<html><body><table><tr><td><a href="?C=N;O=D">Name</a></td></tr>\n'
+        b'<tr><td><a href="rpkg/">rpkg/</a></td>'
+        b'<td><A HREF="r%26pkg/">r&amp;pkg/</A></td></tr></table></body></html>'
+    )
+    webpage = get_webpage("https://cran.r-project.org/src/contrib/Archive/")
+    assert webpage == [
+        ("?C=N;O=D", "Name"),
+        ("rpkg/", "rpkg/"),
+        ("r%26pkg/", "r&pkg/"),
+    ]
+    assert get_webpage("https://cran.r-project.org/src/contrib/Archive/") is webpage
+    mock_get.assert_called_once()
+
+
+@patch("grayskull.strategy.cran.CRAN_SESSION.get")
+def test_get_webpage_not_modified(mock_get):
+    mock_get.return_value.status_code = 304
+    assert get_webpage("https://cran.r-project.org/src/contrib/", 0.0) is None
+    assert mock_get.call_args.kwargs["headers"] == {
+        "If-Modified-Since": "Thu, 01 Jan 1970 00:00:00 GMT"
+    }
+
+
 @patch("grayskull.strategy.cran.get_webpage")
 def test_scrap_cran_archive_page_for_package_folder_url(
-    mock_get_webpage, webpage_magic_mock
+    mock_get_webpage, webpage_anchors
 ):
-    mock_get_webpage.return_value = webpage_magic_mock
+    mock_get_webpage.return_value = webpage_anchors
     assert (
         scrap_cran_archive_page_for_package_folder_url("CRAN_URL", "PKG_NAME")
         == "CRAN_URL/PKG_NAME_URL_BAR/"
     )
+    with pytest.raises(ValueError):
+        scrap_cran_archive_page_for_package_folder_url("CRAN_URL", "OTHER_PACKAGE")
+    mock_get_webpage.assert_called_once_with("CRAN_URL")
 
 
 @patch("grayskull.strategy.cran.get_webpage")
-def test_scrap_cran_pkg_folder_page_for_full_url(mock_get_webpage, webpage_magic_mock):
-    mock_get_webpage.return_value = webpage_magic_mock
+def test_scrap_cran_pkg_folder_page_for_full_url(mock_get_webpage, webpage_anchors):
+    mock_get_webpage.return_value = webpage_anchors
     assert (
         scrap_cran_pkg_folder_page_for_full_url("CRAN_URL", "PKG_NAME", "1.0.0")
         == "CRAN_URL/PKG_NAME_URL"
     )
 
 
-@patch("grayskull.strategy.cran.get_archive_metadata")
-@patch("grayskull.strategy.cran.sha256_checksum")
-@patch("grayskull.strategy.cran.download_cran_pkg")
+@patch("grayskull.strategy.cran.cran_url_exists", return_value=True)
+@patch("grayskull.strategy.cran.get_webpage")
+def test_get_cran_index_archived_version(
+    mock_get_webpage, mock_url_exists, webpage_anchors
+):
+    mock_get_webpage.return_value = webpage_anchors
+    assert get_cran_index("CRAN_URL", "pkg_name", "0.1.0") == (
+        "pkg_name",
+        "0.1.0",
+        "CRAN_URL/src/contrib/Archive/PKG_NAME/PKG_NAME_0.1.0.tar.gz",
+    )
+    mock_url_exists.assert_called_once_with(
+        "CRAN_URL/src/contrib/Archive/PKG_NAME/PKG_NAME_0.1.0.tar.gz"
+    )
+    mock_get_webpage.assert_called_once()
+
+
+@patch("grayskull.strategy.cran.scrap_cran_pkg_folder_page_for_full_url")
+@patch("grayskull.strategy.cran.scrap_cran_archive_page_for_package_folder_url")
+@patch("grayskull.strategy.cran.cran_url_exists", return_value=False)
+@patch("grayskull.strategy.cran.get_webpage")
+def test_get_cran_index_archived_version_fallback(
+    mock_get_webpage, mock_url_exists, mock_archive_page, mock_pkg_page, webpage_anchors
+):
+    mock_get_webpage.return_value = webpage_anchors
+    mock_pkg_page.return_value = "PKG_URL"
+    assert get_cran_index("CRAN_URL", "pkg_name", "0.1.0") == (
+        "pkg_name",
+        "0.1.0",
+        "PKG_URL",
+    )
+    mock_archive_page.assert_called_once_with(
+        "CRAN_URL/src/contrib/Archive", "pkg_name"
+    )
+
+
+@patch("grayskull.strategy.cran.get_cran_pkg_metadata")
 @patch("grayskull.strategy.cran.get_cran_index")
 def test_get_cran_metadata_need_compilation(
     mock_get_cran_index,
-    mock_download_cran_pkg,
-    mock_sha256,
-    mock_get_archive_metadata,
-    tmp_path,
+    mock_get_cran_pkg_metadata,
 ):
     mock_get_cran_index.return_value = ("rpkg", "1.0.0", "http://foobar")
-    mock_sha256.return_value = 123456
-    mock_download_cran_pkg.return_value = str(tmp_path / "rpkg-1.0.0.tar.gz")
-    mock_get_archive_metadata.return_value = {
-        "orig_lines": ["foo", "bar"],
-        "License": "MIT",
-        "NeedsCompilation": "yes",
-        "URL": "PKG-URL",
-    }
+    mock_get_cran_pkg_metadata.return_value = (
+        {
+            "orig_lines": ["foo", "bar"],
+            "License": "MIT",
+            "NeedsCompilation": "yes",
+            "URL": "PKG-URL",
+        },
+        123456,
+    )
     cfg = Configuration(name="rpkg", version="1.0.0")
     result_metadata, r_recipe_comment = get_cran_metadata(
         cfg, "https://cran.r-project.org"
@@ -103,3 +247,210 @@ def test_get_cran_metadata_need_compilation(
         "{{ compiler('m2w64_cxx') }}  # [win]",
         "posix  # [win]",
     ]
+
+
+@patch("grayskull.strategy.cran.invalidate_cran_contrib_index")
+@patch("grayskull.strategy.cran.get_cran_pkg_metadata")
+@patch("grayskull.strategy.cran.get_cran_index")
+def test_get_cran_metadata_tarball_moved_to_archive(
+    mock_get_cran_index, mock_get_cran_pkg_metadata, mock_invalidate
+):
+    mock_get_cran_index.side_effect = [
+        ("rpkg", "1.0.0", "CRAN_URL/src/contrib/rpkg_1.0.0.tar.gz"),
+        ("rpkg", "1.0.0", "CRAN_URL/src/contrib/Archive/rpkg/rpkg_1.0.0.tar.gz"),
+    ]
+    mock_get_cran_pkg_metadata.side_effect = [
+        requests.HTTPError(response=MagicMock(status_code=404)),
+        ({"orig_lines": [], "License": "MIT", "URL": "PKG-URL"}, "SHA256"),
+    ]
+    cfg = Configuration(name="rpkg", version="1.0.0")
+    result_metadata, _ = get_cran_metadata(cfg, "CRAN_URL")
+    assert result_metadata["source"] == {
+        "url": "CRAN_URL/src/contrib/Archive/rpkg/rpkg_{{ version }}.tar.gz",
+        "sha256": "SHA256",
+    }
+    mock_invalidate.assert_called_once_with("CRAN_URL")
+
+
+@patch("grayskull.strategy.cran.get_cran_pkg_metadata")
+@patch("grayskull.strategy.cran.get_cran_index")
+def test_get_cran_metadata_imports(mock_get_cran_index, mock_get_cran_pkg_metadata):
+    mock_get_cran_index.return_value = ("rpkg", "1.0.0", "http://foobar")
+    mock_get_cran_pkg_metadata.return_value = (
+        {
+            "orig_lines": [],
+            "Imports": "MASS, R.utils ( >= 1.27.1 ),Rcpp(>=0.12.0-1),",
+            "License": "MIT",
+            "URL": "PKG-URL",
+        },
+        123456,
+    )
+    cfg = Configuration(name="rpkg", version="1.0.0")
+    result_metadata, _ = get_cran_metadata(cfg, "https://cran.r-project.org")
+    assert result_metadata["requirements"]["run"] == [
+        "r-MASS",
+        "r-R.utils >=1.27.1",
+        "r-Rcpp >=0.12.0-1",
+        "r-base",
+    ]
+
+
+DESCRIPTION_CONTENT = b"""Package: rpkg
+Version: 1.0.0
+Imports: MASS, R.utils (>=
+        1.27.1)
+License: MIT
+URL: https://example.com/rpkg
+NeedsCompilation: no
+"""
+
+
+@pytest.fixture
+def cran_tarball(tmp_path):
+    tarball = tmp_path / "rpkg_1.0.0.tar.gz"
+    with tarfile.open(tarball, "w:gz") as tf:
+        for name, content in (
+            ("rpkg/inst/DESCRIPTION", b"Package: wrong"),
+            ("rpkg/DESCRIPTION", DESCRIPTION_CONTENT),
+        ):
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            tf.addfile(info, io.BytesIO(content))
+    return str(tarball)
+
+
+@patch("grayskull.strategy.cran.CRAN_SESSION.get")
+def test_get_cran_pkg_metadata(mock_get, cran_tarball):
+    with open(cran_tarball, "rb") as f:
+        tarball_content = f.read()
+    mock_get.return_value.__enter__.return_value.raw = io.BytesIO(tarball_content)
+    pkg_url = "https://cran.r-project.org/src/contrib/rpkg_1.0.0.tar.gz"
+    metadata, sha256 = get_cran_pkg_metadata(pkg_url)
+    assert metadata["Package"] == "rpkg"
+    assert sha256 == hashlib.sha256(tarball_content).hexdigest()
+    assert get_cran_pkg_metadata(pkg_url) == (metadata, sha256)
+    next(get_cache_dir("cran").glob("*/rpkg_1.0.0.tar.gz")).unlink()
+    assert get_cran_pkg_metadata(pkg_url) == (metadata, sha256)
+    mock_get.assert_called_once()
+
+
+@pytest.mark.parametrize(
+    "cached",
+    [
+        '{"sha256": "0", "description": {"orig_lines": []}}',
+        '{"version": 2, "sha256": "0", "description": {"orig_lines": []}}',
+        "{not json",
+    ],
+)
+@patch("grayskull.strategy.cran.CRAN_SESSION.get")
+def test_get_cran_pkg_metadata_invalid_cache(mock_get, cran_tarball, cached):
+    with open(cran_tarball, "rb") as f:
+        tarball_content = f.read()
+    mock_get.return_value.__enter__.return_value.raw = io.BytesIO(tarball_content)
+    pkg_url = "https://cran.r-project.org/src/contrib/rpkg_1.0.0.tar.gz"
+    metadata, sha256 = get_cran_pkg_metadata(pkg_url)
+    metadata_file = next(get_cache_dir("cran").glob("*/rpkg_1.0.0.tar.gz.json"))
+    metadata_file.write_text(cached)
+    # the outdated or corrupted cache is rebuilt from the cached tarball
+    assert get_cran_pkg_metadata(pkg_url) == (metadata, sha256)
+    mock_get.assert_called_once()
+
+
+@patch("grayskull.strategy.cran.sha256_checksum", wraps=sha256_checksum)
+@patch("grayskull.strategy.cran.CRAN_SESSION.get")
+def test_get_cran_pkg_metadata_cache_hash_only_changed_tarball(
+    mock_get, mock_sha256_checksum, cran_tarball
+):
+    with open(cran_tarball, "rb") as f:
+        tarball_content = f.read()
+    mock_get.return_value.__enter__.return_value.raw = io.BytesIO(tarball_content)
+    pkg_url = "https://cran.r-project.org/src/contrib/rpkg_1.0.0.tar.gz"
+    metadata, sha256 = get_cran_pkg_metadata(pkg_url)
+    assert get_cran_pkg_metadata(pkg_url) == (metadata, sha256)
+    mock_sha256_checksum.assert_not_called()
+    tarball = next(get_cache_dir("cran").glob("*/rpkg_1.0.0.tar.gz"))
+    os.utime(tarball, ns=(0, 0))
+    assert get_cran_pkg_metadata(pkg_url) == (metadata, sha256)
+    mock_sha256_checksum.assert_called_once_with(tarball)
+    # the new mtime was stored, the tarball is not hashed again
+    assert get_cran_pkg_metadata(pkg_url) == (metadata, sha256)
+    mock_sha256_checksum.assert_called_once()
+
+
+@patch("grayskull.strategy.cran.CRAN_SESSION.get")
+def test_get_cran_pkg_metadata_cache_per_repository(mock_get, cran_tarball):
+    with open(cran_tarball, "rb") as f:
+        tarball_content = f.read()
+    mock_get.return_value.__enter__.side_effect = lambda: MagicMock(
+        raw=io.BytesIO(tarball_content)
+    )
+    get_cran_pkg_metadata("https://cran.r-project.org/src/contrib/rpkg_1.0.0.tar.gz")
+    get_cran_pkg_metadata("https://example.com/cran/src/contrib/rpkg_1.0.0.tar.gz")
+    assert mock_get.call_count == 2
+    assert len(list(get_cache_dir("cran").glob("*/rpkg_1.0.0.tar.gz"))) == 2
+    assert not list(get_cache_dir("cran").rglob("*.part"))
+
+
+def test_prune_cran_cache():
+    for i, folder in enumerate(("repo1", "repo2", "repo1")):
+        tarball = get_cache_dir("cran", folder) / f"rpkg{i}_1.0.0.tar.gz"
+        tarball.write_bytes(b"0" * 10)
+        metadata_file = tarball.with_name(f"{tarball.name}.json")
+        metadata_file.write_text("{}")
+        os.utime(tarball, (i, i))
+        # the metadata is touched when the package is used again
+        os.utime(metadata_file, (10 - i, 10 - i))
+    prune_cran_cache(20)
+    assert sorted(
+        path.name for path in get_cache_dir("cran").rglob("*") if path.is_file()
+    ) == [
+        "rpkg0_1.0.0.tar.gz",
+        "rpkg0_1.0.0.tar.gz.json",
+        "rpkg1_1.0.0.tar.gz",
+        "rpkg1_1.0.0.tar.gz.json",
+    ]
+
+
+@patch("grayskull.strategy.cran.CRAN_SESSION.get")
+def test_get_cran_pkg_metadata_no_description(mock_get, tmp_path):
+    tarball = tmp_path / "rpkg_1.0.0.tar.gz"
+    with tarfile.open(tarball, "w:gz") as tf:
+        info = tarfile.TarInfo("rpkg/README")
+        tf.addfile(info, io.BytesIO(b""))
+    mock_get.return_value.__enter__.return_value.raw = io.BytesIO(tarball.read_bytes())
+    with pytest.raises(SystemExit):
+        get_cran_pkg_metadata(
+            "https://cran.r-project.org/src/contrib/rpkg_1.0.0.tar.gz"
+        )
+    assert not [path for path in get_cache_dir("cran").rglob("*") if path.is_file()]
+
+
+@patch("grayskull.strategy.cran.libarchive", None)
+@patch("grayskull.strategy.cran.igzip", None)
+def test_read_cran_tarball_stdlib_gzip(cran_tarball):
+    with open(cran_tarball, "rb") as f:
+        metadata, sha256 = read_cran_tarball(f)
+    assert metadata["Package"] == "rpkg"
+    assert sha256 == sha256_checksum(cran_tarball)
+
+
+@patch("grayskull.strategy.cran.libarchive", None)
+def test_read_cran_tarball_isal(cran_tarball):
+    pytest.importorskip("isal")
+    copy = io.BytesIO()
+    with open(cran_tarball, "rb") as f:
+        metadata, sha256 = read_cran_tarball(f, copy_to=copy)
+    assert metadata["Package"] == "rpkg"
+    assert metadata["Imports"] == "MASS, R.utils (>= 1.27.1)"
+    assert sha256 == sha256_checksum(cran_tarball)
+    with open(cran_tarball, "rb") as f:
+        assert copy.getvalue() == f.read()
+
+
+def test_read_cran_tarball_libarchive(cran_tarball):
+    pytest.importorskip("libarchive")
+    with open(cran_tarball, "rb") as f:
+        metadata, sha256 = read_cran_tarball(f)
+    assert metadata["Package"] == "rpkg"
+    assert metadata["Imports"] == "MASS, R.utils (>= 1.27.1)"
+    assert sha256 == sha256_checksum(cran_tarball)
@@ -12,7 +12,7 @@ from grayskull.strategy.parse_poetry_version import (
 
 
 @pytest.mark.parametrize(
-    "invalid_version", ["asdf", "", ".", "x.2.3", "1.x.3", "1.2.x"]
+    "invalid_version", ["asdf", "", ".", "x.2.3", "1.x.3", "1.2.x", "1.2.3\n"]
 )
 def test_parse_version_failure(invalid_version):
     with pytest.raises(InvalidVersion):
@@ -1,14 +1,32 @@
+import hashlib
+import io
+import sys
+import tarfile
 from pathlib import Path
+from subprocess import CalledProcessError
+from unittest.mock import MagicMock
+
+import pytest
+from pkginfo import UnpackedSDist
 
 from grayskull.config import Configuration
 from grayskull.main import create_python_recipe
 from grayskull.strategy.py_base import (
     clean_deps_for_conda_forge,
+    discover_license,
+    download_sdist_pkg,
     ensure_pep440,
+    find_egg_info_top_level,
+    find_sdist_files,
     generic_py_ver_to,
     get_sdist_metadata,
+    has_static_requirements,
+    is_setup_py_declarative,
     merge_deps_toml_setup,
+    pip_install_dep,
+    pip_install_deps,
     split_deps,
+    unpack_sdist,
     update_requirements_with_pin,
 )
 from grayskull.utils import PyVer
@@ -67,6 +85,12 @@ def test_merge_deps_toml_setup():
     ]
 
 
+def test_merge_deps_toml_setup_normalized_names():
+    assert merge_deps_toml_setup(
+        ["Foo_Bar>1.0", "zope.interface", "baz"], ["foo-bar >1.0", "zope-interface"]
+    ) == ["foo-bar >1.0", "zope-interface", "baz"]
+
+
 def test_get_sdist_metadata_toml_files_windrose():
     windrose_path = Path(__file__).parent / "data" / "pkgs" / "windrose-1.8.1.tar"
 
@@ -162,3 +186,198 @@ def test_split_deps():
 
 def test_split_deps_space():
     assert split_deps(">=1.8.0 <3.0.0 !=2.0.1") == [">=1.8.0", "<3.0.0", "!=2.0.1"]
+
+
+@pytest.mark.parametrize(
+    "metadata_version, dynamic, expected",
+    [
+        ("2.1", "", False),
+        ("2.2", "", True),
+        ("2.4", "Dynamic: Requires-Dist\n", False),
+        ("2.4", "Dynamic: license\n", True),
+    ],
+)
+def test_has_static_requirements(tmp_path, metadata_version, dynamic, expected):
+    (tmp_path / "PKG-INFO").write_text(
+        f"Metadata-Version: {metadata_version}\nName: foo\nVersion: 1.0\n{dynamic}"
+    )
+    assert has_static_requirements(UnpackedSDist(tmp_path)) is expected
+
+
+@pytest.mark.parametrize(
+    "content, expected",
+    [
+        ("from setuptools import setup\nsetup()\n", True),
+        (
+            '"""Stub"""\nimport setuptools\n\nif __name__ == "__main__":\n'
+            "    setuptools.setup()\n",
+            True,
+        ),
+        ("from setuptools import setup\nsetup(name='foo')\n", False),
+        ("import os\nfrom setuptools import setup\nsetup()\n", False),
+        ("setup(\n", False),
+    ],
+)
+def test_is_setup_py_declarative(tmp_path, content, expected):
+    path_setup = tmp_path / "setup.py"
+    path_setup.write_text(content)
+    assert is_setup_py_declarative(path_setup) is expected
+    assert is_setup_py_declarative(None) is True
+
+
+def test_get_sdist_metadata_static_requirements_from_pkg_info(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "setup.py").write_text("from setuptools import setup\nsetup()\n")
+    (src / "PKG-INFO").write_text(
+        "Metadata-Version: 2.2\nName: pkg\nVersion: 1.0\n"
+        "Requires-Dist: requests>=2.0\n"
+        "Requires-Dist: tomli; python_version < '3.11'\n"
+        "Provides-Extra: test\n"
+        'Requires-Dist: pytest>=7; extra == "test"\n'
+    )
+    sdist = tmp_path / "pkg-1.0.tar.gz"
+    with tarfile.open(sdist, "w:gz") as tar:
+        tar.add(src, "pkg-1.0")
+
+    sdist_metadata = get_sdist_metadata(
+        str(sdist),
+        Configuration(
+            name="pkg", version="1.0", from_local_sdist=True, local_sdist=str(sdist)
+        ),
+    )
+    assert sdist_metadata["install_requires"] == [
+        "requests>=2.0",
+        "tomli; python_version < '3.11'",
+    ]
+    assert sdist_metadata["extras_require"] == {"test": ["pytest>=7"]}
+
+
+def test_pip_install_deps(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        "grayskull.strategy.py_base.check_output", lambda cmd: calls.append(cmd)
+    )
+    data_dist = {}
+    pip_install_deps(data_dist, ["numpy", "pkg_resources", "Cython"], "/tmp/pip")
+    assert calls == [
+        [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "numpy",
+            "setuptools",
+            "Cython",
+            "--target=/tmp/pip",
+        ]
+    ]
+    assert data_dist["setup_requires"] == ["numpy", "cython"]
+
+
+def test_pip_install_deps_fallback(monkeypatch):
+    def fake_check_output(cmd):
+        if "missing-dep" in cmd:
+            raise CalledProcessError(1, cmd)
+
+    monkeypatch.setattr("grayskull.strategy.py_base.check_output", fake_check_output)
+    data_dist = {}
+    pip_install_deps(data_dist, ["numpy", "missing-dep"], "/tmp/pip")
+    assert data_dist["setup_requires"] == ["numpy"]
+
+    pip_install_dep(data_dist, "pkg_resources", "/tmp/pip")
+    assert data_dist["setup_requires"] == ["numpy"]
+
+
+def test_unpack_sdist_tarball(tmp_path):
+    src = tmp_path / "src"
+    (src / "pkg" / "sub").mkdir(parents=True)
+    (src / "pkg" / "setup.py").write_text("from setuptools import setup\n")
+    (src / "pkg" / "sub" / "LICENSE").write_text("MIT")
+    with tarfile.open(tmp_path / "pkg-1.0.tar.gz", "w:gz") as tar:
+        tar.add(src / "pkg", "pkg-1.0")
+
+    sha256 = unpack_sdist(tmp_path / "pkg-1.0.tar.gz", str(tmp_path / "out"), True)
+    assert (
+        sha256 == hashlib.sha256((tmp_path / "pkg-1.0.tar.gz").read_bytes()).hexdigest()
+    )
+    assert (tmp_path / "out" / "pkg-1.0" / "setup.py").is_file()
+    assert (tmp_path / "out" / "pkg-1.0" / "sub" / "LICENSE").read_text() == "MIT"
+
+
+@pytest.mark.parametrize("can_link", [True, False])
+def test_unpack_sdist_tarball_hardlink(tmp_path, monkeypatch, can_link):
+    if not can_link:
+        # copying the hardlink target needs to seek back in the stream
+        monkeypatch.setattr("os.link", MagicMock(side_effect=OSError))
+    sdist = tmp_path / "pkg-1.0.tar.gz"
+    with tarfile.open(sdist, "w:gz") as tar:
+        license_info = tarfile.TarInfo("pkg-1.0/LICENSE")
+        license_info.size = 3
+        tar.addfile(license_info, io.BytesIO(b"MIT"))
+        link_info = tarfile.TarInfo("pkg-1.0/sub/LICENSE")
+        link_info.type = tarfile.LNKTYPE
+        link_info.linkname = "pkg-1.0/LICENSE"
+        tar.addfile(link_info)
+
+    sha256 = unpack_sdist(sdist, str(tmp_path / "out"), True)
+    assert sha256 == hashlib.sha256(sdist.read_bytes()).hexdigest()
+    assert (tmp_path / "out" / "pkg-1.0" / "LICENSE").read_text() == "MIT"
+    assert (tmp_path / "out" / "pkg-1.0" / "sub" / "LICENSE").read_text() == "MIT"
+
+
+def test_download_sdist_pkg_hasher(tmp_path, monkeypatch):
+    response = MagicMock()
+    response.__enter__.return_value = response
+    response.headers = {"Content-length": "6"}
+    response.iter_content.return_value = [b"foo", b"", b"bar"]
+    monkeypatch.setattr(
+        "grayskull.strategy.py_base.PYPI_SESSION.get", lambda *a, **kw: response
+    )
+    dest = tmp_path / "pkg-1.0.tar.gz"
+    digest = download_sdist_pkg(
+        "https://pypi.org/pkg", str(dest), "pkg", hashlib.sha256()
+    )
+    assert dest.read_bytes() == b"foobar"
+    assert digest == hashlib.sha256(b"foobar").hexdigest()
+    assert download_sdist_pkg("https://pypi.org/pkg", str(dest), "pkg") is None
+
+
+def test_find_sdist_files(tmp_path):
+    (tmp_path / "pkg-1.0" / "docs").mkdir(parents=True)
+    (tmp_path / "pkg-1.0" / "docs" / "setup.py").write_text("")
+    (tmp_path / "pkg-1.0" / "pyproject.toml").write_text("")
+    (tmp_path / "pkg-1.0" / "PKG-INFO").write_text("")
+    assert find_sdist_files(tmp_path, ("pyproject.toml", "PKG-INFO", "setup.py")) == {
+        "pyproject.toml": tmp_path / "pkg-1.0" / "pyproject.toml",
+        "PKG-INFO": tmp_path / "pkg-1.0" / "PKG-INFO",
+        "setup.py": tmp_path / "pkg-1.0" / "docs" / "setup.py",
+    }
+    assert find_sdist_files(tmp_path, ("setup.cfg",)) == {}
+
+
+def test_find_egg_info_top_level(tmp_path):
+    assert find_egg_info_top_level(tmp_path) is None
+    nested = tmp_path / "pkg-1.0" / "src" / "pkg.egg-info"
+    nested.mkdir(parents=True)
+    (nested / "top_level.txt").write_text("pkg")
+    assert find_egg_info_top_level(tmp_path) == nested / "top_level.txt"
+    root = tmp_path / "pkg-1.0" / "pkg.egg-info"
+    root.mkdir()
+    (root / "top_level.txt").write_text("pkg")
+    assert find_egg_info_top_level(tmp_path) == root / "top_level.txt"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://github.com/conda/grayskull",
+        "git+https://github.com/conda/grayskull",
+        "git://github.com/conda/grayskull",
+        "https://github.com#readme",
+    ],
+)
+def test_discover_license_github_project_url(url, mocker):
+    search_license_file = mocker.patch("grayskull.strategy.py_base.search_license_file")
+    discover_license({"project_url": url, "url": None})
+    assert search_license_file.call_args.args[1] == url
@@ -7,9 +7,11 @@ import pytest
 
 from grayskull.main import generate_recipes_from_list, init_parser
 from grayskull.strategy.py_toml import (
+    InvalidPoetryDependency,
     add_flit_metadata,
     add_pep725_metadata,
     add_poetry_metadata,
+    encode_poetry_deps,
     get_all_toml_info,
     get_constrained_dep,
 )
@@ -107,6 +109,24 @@ def test_poetry_get_constrained_dep_tilde_version_string():
     assert next(get_constrained_dep("~0.21.0", "s3fs")) == "s3fs >=0.21.0,<0.22.0"
 
 
+def test_encode_poetry_deps_optional():
+    assert encode_poetry_deps(
+        {
+            "python": "^3.8",
+            "requests": {"version": "^2.28", "optional": True},
+            "numpy": [{"version": "^1.24", "python": ">=3.9"}],
+        }
+    ) == (
+        ["python >=3.8.0,<4.0.0", "numpy >=1.24.0,<2.0.0  # [py>=39]"],
+        ["requests >=2.28.0,<3.0.0"],
+    )
+
+
+def test_poetry_get_constrained_dep_invalid_type():
+    with pytest.raises(InvalidPoetryDependency, match="received int"):
+        get_constrained_dep(1, "s3fs")
+
+
 def test_poetry_get_constrained_dep_caret_version_string():
     assert next(get_constrained_dep("^1.24.0", "numpy")) == "numpy >=1.24.0,<2.0.0"
 
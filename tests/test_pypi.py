@@ -872,6 +872,21 @@ def test_get_entry_points_from_sdist():
     ) == sorted(["gui_scripts=entrypoints"])
 
 
+def test_get_entry_points_from_sdist_string():
+    assert get_entry_points_from_sdist(
+        {
+            "entry_points": "[console_scripts]\nfoo = foo.cli:main\n"
+            "bar='bar:run'\n\n[gui_scripts]\nbaz = baz.gui:main [extra]\n"
+        }
+    ) == ["foo = foo.cli:main", "bar = bar:run", "baz = baz.gui:main [extra]"]
+    assert (
+        get_entry_points_from_sdist(
+            {"entry_points": "[console_scripts]\nfoo = 'foo:main\n"}
+        )
+        == []
+    )
+
+
 def test_build_noarch_skip():
     recipe = create_python_recipe("hypothesis=5.5.2")[0]
     assert recipe["build"]["noarch"] == "python"
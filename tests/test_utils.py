@@ -34,6 +34,15 @@ def test_get_vendored_dependencies(data_dir):
     assert sorted(all_deps) == sorted(["numpy", "pandas", "requests"])
 
 
+def test_get_vendored_dependencies_file_changed(tmp_path):
+    setup_py = tmp_path / "setup.py"
+    setup_py.write_text("import numpy\n")
+    assert get_vendored_dependencies(str(setup_py)) == ["numpy"]
+    setup_py.write_text("import pandas\n")
+    os.utime(setup_py, ns=(0, setup_py.stat().st_mtime_ns + 1))
+    assert get_vendored_dependencies(str(setup_py)) == ["pandas"]
+
+
 def test_format_dependencies_optional_double_equal():
     assert format_dependencies(
         ["dask[dataframe,distributed]==2021.10.0"], "dask-sql"